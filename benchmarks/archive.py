@@ -0,0 +1,48 @@
+"""
+Crawl of the fixture pages of the 72 puzzles of `puzzles.db` with 50 ms of latency into a page archive, then
+replays of `extract_all_puzzles` over the archive, with 1 and with all the CPUs.
+
+    python -m benchmarks.archive
+"""
+import os
+import tempfile
+import time
+
+from benchmarks.fixture_server import FixtureServer, fixture_pages
+from extractors.archive import INDEX_SUFFIX, PAGES_SUFFIX, PageArchive
+from extractors.brainzilla_extractors import extract_all_puzzles, replay_all_puzzles
+from extractors.crawler import Crawler
+
+LATENCY = 0.05
+
+
+def _fields(puzzles):
+    return [(puzzle.title, puzzle.description, puzzle.clues, puzzle.url) for puzzle in puzzles]
+
+
+def main():
+    archive_dir = tempfile.mkdtemp()
+    pages = fixture_pages()
+    print(f"{'run':<28}{'time (s)':>10}{'pages/s':>10}")
+    with FixtureServer(pages, latency=LATENCY) as server, PageArchive(archive_dir) as archive:
+        start_time = time.perf_counter()
+        crawled = _fields(extract_all_puzzles(Crawler(8, requests_per_second=0, archive=archive), server.base_url))
+        elapsed = time.perf_counter() - start_time
+        print(f"{'crawl, 8 workers':<28}{elapsed:>10.2f}{len(pages) / elapsed:>10.1f}")
+        domain = server.base_url
+
+    raw_size = sum(len(html.encode("utf-8")) for html in pages.values())
+    pages_size = os.path.getsize(os.path.join(archive_dir, f"{archive.crawl_id}{PAGES_SUFFIX}"))
+    index_size = os.path.getsize(archive.index_file)
+    for workers in (1, os.cpu_count() or 1):
+        start_time = time.perf_counter()
+        replayed = _fields(replay_all_puzzles(archive.index_file, domain, workers))
+        elapsed = time.perf_counter() - start_time
+        print(f"{f'replay, {workers} workers':<28}{elapsed:>10.2f}{len(pages) / elapsed:>10.1f}")
+        assert replayed == crawled, "the replay extracted different puzzles"
+    print(f"Archive: {raw_size / 2 ** 10:.0f} KB of pages stored in {pages_size / 2 ** 10:.0f} KB "
+          f"(+ {index_size / 2 ** 10:.0f} KB of {INDEX_SUFFIX} index)")
+
+
+if __name__ == '__main__':
+    main()
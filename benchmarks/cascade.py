@@ -0,0 +1,64 @@
+"""
+Compares the rules-first cascade with the full pipeline on the annotated testing puzzles: entity-level metrics
+from `ner_eval.compute_metrics` and throughput.
+
+    python -m benchmarks.cascade
+"""
+import time
+from collections import namedtuple
+from typing import Callable, List
+
+from ner_eval import compute_metrics, compute_precision_recall_wrapper
+from output_generator import extract_entities_cascade, extract_entities_from_clues
+from utils import load_data
+
+ANNOTATED_DATA = "testing_data/brainzilla_testing_puzzles_15_adnotated.json"
+
+Entity = namedtuple("Entity", "e_type start_offset end_offset")
+
+
+def _to_entities(entities: dict, offset: int) -> List[Entity]:
+    return [Entity(e_type=label, start_offset=offset + start, end_offset=offset + end)
+            for label, texts in entities.items()
+            for offsets in texts.values()
+            for start, end in offsets]
+
+
+def evaluate(extract: Callable[[str], dict], annotated_data: list):
+    """Runs an extraction function over the annotated puzzles and returns its metrics and elapsed time"""
+    true, pred = [], []
+    offset = 0
+    start_time = time.perf_counter()
+    for text, annotations in annotated_data:
+        # offset the puzzles, so the entities of different puzzles never overlap
+        pred.extend(_to_entities(extract(text), offset))
+        true.extend(Entity(e_type=label, start_offset=offset + start, end_offset=offset + end)
+                    for start, end, label in annotations["entities"])
+        offset += len(text) + 1
+    elapsed = time.perf_counter() - start_time
+    tags = sorted({ent.e_type for ent in true})
+    results, _ = compute_metrics(true, pred, tags)
+    return compute_precision_recall_wrapper(results), elapsed
+
+
+def main():
+    annotated_data = load_data(ANNOTATED_DATA)
+    tokens_count = sum(len(text.split()) for text, _ in annotated_data)
+    # load the model before timing
+    extract_entities_from_clues(annotated_data[0][0], use_cache=False)
+
+    stats = {}
+    full_results, full_time = evaluate(lambda text: extract_entities_from_clues(text, use_cache=False),
+                                       annotated_data)
+    cascade_results, cascade_time = evaluate(lambda text: extract_entities_cascade(text, stats), annotated_data)
+
+    print(f"Cascade sent {stats['escalated_lines']}/{stats['lines']} lines to the statistical NER")
+    print(f"{'':<10}{'strict P':>10}{'strict R':>10}{'type P':>10}{'type R':>10}{'words/s':>10}")
+    for name, results, elapsed in (("full", full_results, full_time), ("cascade", cascade_results, cascade_time)):
+        print(f"{name:<10}{results['strict']['precision']:>10.3f}{results['strict']['recall']:>10.3f}"
+              f"{results['ent_type']['precision']:>10.3f}{results['ent_type']['recall']:>10.3f}"
+              f"{tokens_count / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+import random
+from typing import List
+
+
+def synthetic_corpus(clues: List[str], size: int, seed: int = 0) -> List[str]:
+    """Builds `size` puzzles by sampling clue lines of the real puzzles"""
+    rng = random.Random(seed)
+    lines = [line for clue_text in clues for line in clue_text.splitlines() if line.strip()]
+    lines_per_puzzle = max(1, len(lines) // len(clues))
+    return ["\n".join(rng.choices(lines, k=lines_per_puzzle)) for _ in range(size)]
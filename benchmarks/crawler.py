@@ -0,0 +1,58 @@
+"""
+Crawl of the fixture pages of the 72 puzzles of `puzzles.db`, served locally with 50 ms of latency and 2% of
+transient 503 errors: the previous serial `extract_all_puzzles` against the concurrent `Crawler`.
+
+    python -m benchmarks.crawler
+"""
+import time
+from typing import List
+from urllib.parse import urlsplit
+
+import requests
+
+from benchmarks.fixture_server import FixtureServer, fixture_pages
+from extractors.brainzilla_extractors import ZEBRA_PUZZLES_PATH, extract_all_puzzles, parse_pages, parse_puzzle
+from extractors.crawler import Crawler
+from repository.models import Puzzle
+
+LATENCY = 0.05
+ERROR_RATE = 0.02
+
+
+def extract_all_puzzles_serially(domain: str) -> List[Puzzle]:
+    """The previous implementation of `extract_all_puzzles`, with a retry so it survives the 503 errors"""
+    def get(url: str) -> requests.Response:
+        response = requests.get(url)
+        return response if response.ok else requests.get(url)
+
+    pages_urls = parse_pages(get(f"{domain}{ZEBRA_PUZZLES_PATH}").text)
+    return [parse_puzzle(get(f"{domain}{path}").text, f"{domain}{path}") for path in pages_urls]
+
+
+def _fields(puzzles: List[Puzzle]) -> List:
+    # each crawl has its own server, on a random port: only the path of the urls can be compared
+    return [(puzzle.title, puzzle.description, puzzle.clues, urlsplit(puzzle.url).path) for puzzle in puzzles]
+
+
+def main():
+    pages = fixture_pages()
+    print(f"{'crawl':<32}{'time (s)':>10}{'pages/s':>10}{'requests':>10}")
+    results = {}
+    for name, crawl in [
+        ("serial", extract_all_puzzles_serially),
+        ("crawler, 1 worker", lambda domain: extract_all_puzzles(Crawler(1, requests_per_second=0), domain)),
+        ("crawler, 8 workers", lambda domain: extract_all_puzzles(Crawler(8, requests_per_second=0), domain)),
+        ("crawler, 8 workers, 20 req/s", lambda domain: extract_all_puzzles(Crawler(8, requests_per_second=20),
+                                                                            domain)),
+    ]:
+        with FixtureServer(pages, latency=LATENCY, error_rate=ERROR_RATE) as server:
+            start_time = time.perf_counter()
+            results[name] = _fields(crawl(server.base_url))
+            elapsed = time.perf_counter() - start_time
+        print(f"{name:<32}{elapsed:>10.2f}{len(pages) / elapsed:>10.1f}{server.requests_count:>10}")
+
+    assert all(result == results["serial"] for result in results.values()), "the crawls found different puzzles"
+
+
+if __name__ == '__main__':
+    main()
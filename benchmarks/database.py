@@ -0,0 +1,79 @@
+"""
+Concurrent read/write throughput on puzzles with 8 workers (threads, then forked processes): the previous
+`SqliteDatabase` with default pragmas against the tuned, pooled database of `repository.connection`.
+
+    python -m benchmarks.database
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Tuple
+
+from peewee import OperationalError, SqliteDatabase
+
+from benchmarks.repository import populate_synthetic_db
+from repository.connection import make_database
+from repository.models import Puzzle, Source
+
+WORKERS = 8
+OPERATIONS_PER_WORKER = 2_000
+WRITE_RATIO = 0.2
+PUZZLES_COUNT = 10_000
+
+
+def _worker(seed: int) -> Tuple[int, int]:
+    """Runs a mix of reads and writes; returns the number of completed operations and of lock errors"""
+    rng = random.Random(seed)
+    database = Puzzle._meta.database
+    completed, errors = 0, 0
+    for _ in range(OPERATIONS_PER_WORKER):
+        puzzle_id = rng.randint(1, PUZZLES_COUNT)
+        try:
+            if rng.random() < WRITE_RATIO:
+                with database.atomic():
+                    Puzzle.update(description=f"Updated by {seed}").where(Puzzle.id == puzzle_id).execute()
+            else:
+                Puzzle.select(Puzzle.clues).where(Puzzle.id == puzzle_id).tuples().get()
+            completed += 1
+        except OperationalError:
+            errors += 1
+    database.close()
+    return completed, errors
+
+
+def _run(name: str, database, db_file: str, template_file: str):
+    shutil.copy(template_file, db_file)
+    with database.bind_ctx([Source, Puzzle]):
+        for executor_class in (ThreadPoolExecutor, ProcessPoolExecutor):
+            database.close()
+            start_time = time.perf_counter()
+            with executor_class(max_workers=WORKERS) as executor:
+                results = list(executor.map(_worker, range(WORKERS)))
+            elapsed = time.perf_counter() - start_time
+            completed = sum(result[0] for result in results)
+            errors = sum(result[1] for result in results)
+            print(f"{name:<12}{executor_class.__name__:<22}{completed / elapsed:>12.0f}{errors:>10}")
+    database.close()
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    template_file = os.path.join(directory, "template.db")
+    template_db = SqliteDatabase(template_file)
+    with template_db.bind_ctx([Source, Puzzle]):
+        template_db.create_tables([Source, Puzzle])
+        populate_synthetic_db(PUZZLES_COUNT)
+    template_db.close()
+
+    print(f"{'database':<12}{'workers':<22}{'ops/s':>12}{'errors':>10}")
+    default_file = os.path.join(directory, "default.db")
+    _run("default", SqliteDatabase(default_file), default_file, template_file)
+    tuned_file = os.path.join(directory, "tuned.db")
+    _run("tuned", make_database(tuned_file), tuned_file, template_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares the memory held by the nested-dict entities and by `EntityResult` for 10k synthetic puzzles, with a
+string table per result and with one shared by each batch of BATCH_SIZE results. The entities come from the
+gazetteer matcher, so the comparison does not need the trained model.
+
+    python -m benchmarks.entity_result
+"""
+import time
+import tracemalloc
+from typing import Callable, List
+
+from benchmarks.corpus import synthetic_corpus
+from entity_result import EntityResult, StringTable
+from gazetteer_matcher import GazetteerMatcher
+from repository.puzzle_repository import get_all_puzzles_with_title
+
+BATCH_SIZE = 100
+
+
+def _measure(build: Callable, texts: List[str]):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    results = [build(text) for text in texts]
+    elapsed = time.perf_counter() - start_time
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return results, size, elapsed
+
+
+def main(size: int = 10_000):
+    clues = [clue_text for _, clue_text in get_all_puzzles_with_title()]
+    corpus = synthetic_corpus(clues, size)
+    matcher = GazetteerMatcher.from_entity_rules()
+    spans = [matcher(text) for text in corpus]
+
+    def build_dict(row: int):
+        return matcher.extract_entities(corpus[row])
+
+    batch_strings = {}
+
+    def build_compact(row: int, strings: StringTable = None):
+        result = EntityResult(strings)
+        for start, end, label in spans[row]:
+            result.append(label, corpus[row][start:end], start, end)
+        return result
+
+    def build_compact_batched(row: int):
+        return build_compact(row, batch_strings.setdefault(row // BATCH_SIZE, StringTable()))
+
+    dicts, dicts_size, dicts_time = _measure(build_dict, range(size))
+    compact, compact_size, compact_time = _measure(build_compact, range(size))
+    batched, batched_size, _ = _measure(build_compact_batched, range(size))
+    assert all(a.to_dict() == b.to_dict() == c for a, b, c in zip(compact, batched, dicts))
+
+    print(f"{size} puzzles, {sum(len(s) for s in spans)} entities")
+    print(f"nested dicts:            {dicts_size / 2 ** 20:8.2f} MB")
+    print(f"EntityResult:            {compact_size / 2 ** 20:8.2f} MB ({dicts_size / compact_size:.1f}x smaller)")
+    print(f"EntityResult, batched:   {batched_size / 2 ** 20:8.2f} MB ({dicts_size / batched_size:.1f}x smaller)")
+
+    start_time = time.perf_counter()
+    for result in compact:
+        result.to_mace4_rows()
+    print(f"mace4 rows from EntityResult: {(time.perf_counter() - start_time) / size * 1e6:.1f} us/puzzle")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Local HTTP server serving fixture pages with the structure of the Brainzilla zebra puzzles pages, built from the
+puzzles of `puzzles.db`. It sends ETag and Last-Modified headers and answers the conditional requests with 304,
+and can simulate network latency and transient 503 errors.
+"""
+import hashlib
+import html
+import random
+import sqlite3
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+from repository.connection import DATABASE_FILE
+
+PUZZLES_PATH = "/logic/zebra/"
+
+
+def render_index(paths: List[str]) -> str:
+    items = "\n".join(f'<li><a href="{html.escape(path)}">{html.escape(path)}</a></li>' for path in paths)
+    return (f'<html><head><title>Zebra Puzzles</title></head><body>'
+            f'<div class="container"><div class="row"><div class="col-lg-8"><ul>\n{items}\n</ul></div>'
+            f'<div class="col-lg-4"><p>Sidebar</p></div></div></div></body></html>')
+
+
+def render_puzzle(title: str, description: str, clues: str) -> str:
+    # Brainzilla pages are mostly navigation, scripts and the puzzle grid; the padding stands for them
+    padding = "\n".join(f'<div class="nav-item"><a href="/other/{i}/">Other puzzle {i}</a></div>' for i in range(200))
+    return (f'<html><head><title>{html.escape(title)}</title><script>var grid = {{}};</script></head><body>'
+            f'<nav>{padding}</nav>'
+            f'<div class="page-header"><h1>{html.escape(title)} Zebra Puzzle</h1>'
+            f'<div class="description">{html.escape(description)}</div></div>'
+            f'<div class="clues">{html.escape(clues)}</div>'
+            f'<table class="grid">{"<tr><td></td></tr>" * 100}</table></body></html>')
+
+
+def fixture_pages(database_file: str = DATABASE_FILE) -> Dict[str, str]:
+    """Returns the {path: html} of the zebra puzzles page and of one page per puzzle of the DB"""
+    with sqlite3.connect(database_file) as connection:
+        puzzles = connection.execute("SELECT title, description, clues, url FROM puzzle ORDER BY id").fetchall()
+    pages = {}
+    for title, description, clues, url in puzzles:
+        path = url[url.index(PUZZLES_PATH):]
+        pages[path] = render_puzzle(title, description, clues)
+    pages[PUZZLES_PATH] = render_index(list(pages))
+    return pages
+
+
+class FixtureServer:
+    """Serves the given pages on localhost; use as a context manager, the pages are at `base_url`"""
+
+    def __init__(self, pages: Dict[str, str], latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.pages = pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests_count = 0
+        self.not_modified_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("localhost", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://localhost:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _page(self, path: str) -> Tuple[bytes, str]:
+        body = self.pages[path].encode("utf-8")
+        return body, '"{}"'.format(hashlib.sha256(body).hexdigest()[:16])
+
+    def _make_handler(self):
+        fixture_server = self
+        last_modified = formatdate(usegmt=True)
+
+        class FixtureRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                with fixture_server._lock:
+                    fixture_server.requests_count += 1
+                    failed = fixture_server._random.random() < fixture_server.error_rate
+                if fixture_server.latency:
+                    time.sleep(fixture_server.latency)
+                if failed:
+                    self._send(503, b"")
+                    return
+                if self.path not in fixture_server.pages:
+                    self._send(404, b"")
+                    return
+                body, etag = fixture_server._page(self.path)
+                if self.headers.get("If-None-Match") == etag:
+                    with fixture_server._lock:
+                        fixture_server.not_modified_count += 1
+                    self._send(304, b"", {"ETag": etag, "Last-Modified": last_modified})
+                    return
+                self._send(200, body, {"ETag": etag, "Last-Modified": last_modified,
+                                       "Content-Type": "text/html; charset=utf-8"})
+
+            def _send(self, status: int, body: bytes, headers: Dict[str, str] = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return FixtureRequestHandler
+
+    def __enter__(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,57 @@
+"""
+Compares the pure-Python GazetteerMatcher with the spaCy EntityRuler of `models/puzzle_ner`: both must find the
+same (start_char, end_char, label) spans on the DB puzzles and on a synthetic corpus made by reshuffling their clue
+lines, which is then used to compare their throughput.
+
+    python -m benchmarks.gazetteer
+"""
+import time
+from typing import List
+
+import spacy
+
+from benchmarks.corpus import synthetic_corpus
+from gazetteer_matcher import GazetteerMatcher
+from repository.puzzle_repository import get_all_puzzles_with_title
+
+RULES_MODEL = "models/puzzle_ner"
+
+
+def _timed(function, texts: List[str]) -> float:
+    start_time = time.perf_counter()
+    for text in texts:
+        function(text)
+    return time.perf_counter() - start_time
+
+
+def main(size: int = 10_000):
+    clues = [clue_text for _, clue_text in get_all_puzzles_with_title()]
+
+    start_time = time.perf_counter()
+    nlp = spacy.load(RULES_MODEL)
+    ruler_load_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    matcher = GazetteerMatcher.from_entity_rules()
+    matcher_load_time = time.perf_counter() - start_time
+
+    def ruler_spans(text: str):
+        return [(ent.start_char, ent.end_char, ent.label_) for ent in nlp(text).ents]
+
+    corpus = synthetic_corpus(clues, size)
+    spans_count = 0
+    for text in clues + corpus:
+        expected = ruler_spans(text)
+        found = matcher(text)
+        assert found == expected, f"{text!r}: the matcher found {found}, the EntityRuler {expected}"
+        spans_count += len(expected)
+    print(f"{len(clues)} DB puzzles and {size} synthetic ones: the same {spans_count} spans")
+
+    ruler_time = _timed(nlp, corpus)
+    matcher_time = _timed(matcher, corpus)
+    print(f"{'':<16}{'load (s)':>10}{'puzzles/s':>12}")
+    print(f"{'EntityRuler':<16}{ruler_load_time:>10.3f}{size / ruler_time:>12.0f}")
+    print(f"{'Gazetteer':<16}{matcher_load_time:>10.3f}{size / matcher_time:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
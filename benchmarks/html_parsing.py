@@ -0,0 +1,85 @@
+"""
+Per-page parse time and peak memory of the puzzle pages: the full `html.parser` tree built previously against
+the `SoupStrainer`-limited parsing of `extractors.html_parsing`, with each available parser. The fixture pages
+are the ones of `benchmarks.fixture_server`, saved to a temporary directory.
+
+    python -m benchmarks.html_parsing
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+from bs4 import BeautifulSoup, FeatureNotFound
+
+from benchmarks.fixture_server import fixture_pages
+from extractors.brainzilla_extractors import ZEBRA_PUZZLES_PATH
+from extractors.html_parsing import PARSERS, PUZZLE_STRAINER
+
+REPEAT = 5
+
+
+def save_fixture_pages(directory: str) -> List[str]:
+    """Saves the puzzle fixture pages as html files; returns their paths"""
+    files = []
+    for i, (path, html) in enumerate(fixture_pages().items()):
+        if path == ZEBRA_PUZZLES_PATH:
+            continue
+        file = os.path.join(directory, f"puzzle_{i}.html")
+        with open(file, "w", encoding="utf-8") as f:
+            f.write(html)
+        files.append(file)
+    return files
+
+
+def _puzzle_fields(soup: BeautifulSoup):
+    header = soup.find('div', class_="page-header")
+    return header.find('h1').text, header.find('div', class_='description').text, soup.find('div', class_="clues").text
+
+
+def _measure(name: str, pages: List[str], parse: Callable[[str], BeautifulSoup]) -> List:
+    fields = [_puzzle_fields(parse(html)) for html in pages]  # warm up
+
+    start_time = time.perf_counter()
+    for _ in range(REPEAT):
+        for html in pages:
+            _puzzle_fields(parse(html))
+    elapsed_ms = (time.perf_counter() - start_time) / (REPEAT * len(pages)) * 1000
+
+    peak = 0
+    for html in pages:
+        tracemalloc.start()
+        _puzzle_fields(parse(html))
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    print(f"{name:<32}{elapsed_ms:>14.2f}{peak / 2 ** 10:>16.0f}")
+    return fields
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    pages = []
+    for file in save_fixture_pages(directory):
+        with open(file, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    print(f"{len(pages)} pages of {sum(map(len, pages)) / len(pages) / 2 ** 10:.0f} KB on average ({directory})")
+
+    print(f"{'parsing':<32}{'time/page (ms)':>14}{'peak/page (KB)':>16}")
+    expected = _measure("html.parser, full tree", pages, lambda html: BeautifulSoup(html, "html.parser"))
+    for parser in PARSERS:
+        for strainer_name, strainer in (("full tree", None), ("strained", PUZZLE_STRAINER)):
+            if parser == "html.parser" and strainer is None:
+                continue
+            try:
+                BeautifulSoup("", parser)
+            except FeatureNotFound:
+                print(f"{parser}: not installed")
+                break
+            fields = _measure(f"{parser}, {strainer_name}", pages,
+                              lambda html, p=parser, s=strainer: BeautifulSoup(html, p, parse_only=s))
+            assert fields == expected, f"{parser}, {strainer_name} extracted different puzzles"
+
+
+if __name__ == '__main__':
+    main()
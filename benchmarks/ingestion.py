@@ -0,0 +1,71 @@
+"""
+Ingestion of 100k synthetic puzzles: the previous `populate_db` path (one `puzzle.save()` per row, autocommit)
+against `repository.puzzle_repository.upsert_puzzles`, then a re-crawl where 10% of the puzzles changed.
+
+    python -m benchmarks.ingestion
+"""
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+from peewee import SqliteDatabase
+
+from repository.models import Puzzle, Source
+from repository.puzzle_repository import get_or_create_source, upsert_puzzles
+
+PUZZLES_COUNT = 100_000
+
+
+def synthetic_puzzles(size: int, source_id: int, seed: int = 0) -> List[Puzzle]:
+    rng = random.Random(seed)
+    words = ["Joshua", "is", "next", "to", "the", "person", "who", "likes", "Red", "shirt", "at", "one", "of",
+             "ends", "Daniel", "bought", "$900", "furniture", "wearing", "Green", "somewhere", "between"]
+    return [Puzzle(title=f"Puzzle {i}",
+                   description="Synthetic puzzle",
+                   clues="\n".join(" ".join(rng.choices(words, k=12)) for _ in range(20)),
+                   url=f"https://example.com/puzzles/{i}/",
+                   source_id=source_id) for i in range(size)]
+
+
+def populate_per_row(puzzles: List[Puzzle]):
+    """The previous implementation of `brainzilla_extractors.populate_db`, without the Source creation"""
+    for puzzle in puzzles:
+        puzzle.save()
+
+
+def _run(name: str, db_file: str, function):
+    db = SqliteDatabase(db_file, pragmas={"journal_mode": "wal", "synchronous": "normal"})
+    with db.bind_ctx([Source, Puzzle]):
+        db.create_tables([Source, Puzzle])
+        source = get_or_create_source("Synthetic", "https://example.com", "/puzzles/")
+        puzzles = synthetic_puzzles(PUZZLES_COUNT, source.id)
+        start_time = time.perf_counter()
+        result = function(puzzles)
+        elapsed = time.perf_counter() - start_time
+        print(f"{name:<40}{elapsed:>10.2f}{PUZZLES_COUNT / elapsed:>14.0f}  {result or ''}")
+
+        if function is upsert_puzzles:
+            # Re-crawl: 10% of the puzzles changed, the others must be skipped
+            recrawled = synthetic_puzzles(PUZZLES_COUNT, source.id)
+            for puzzle in recrawled[::10]:
+                puzzle.clues += "\nThe new clue."
+            start_time = time.perf_counter()
+            result = upsert_puzzles(recrawled)
+            elapsed = time.perf_counter() - start_time
+            print(f"{'upsert_puzzles, re-crawl':<40}{elapsed:>10.2f}{PUZZLES_COUNT / elapsed:>14.0f}  {result}")
+            assert Source.select().count() == 1
+            assert Puzzle.select().count() == PUZZLES_COUNT
+    db.close()
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    print(f"{'ingestion':<40}{'time (s)':>10}{'puzzles/s':>14}")
+    _run("per-row save", os.path.join(directory, "per_row.db"), populate_per_row)
+    _run("upsert_puzzles", os.path.join(directory, "upsert.db"), upsert_puzzles)
+
+
+if __name__ == '__main__':
+    main()
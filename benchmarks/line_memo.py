@@ -0,0 +1,44 @@
+"""
+Reports the clue-line dedup ratio across the DB, checks the line-memoized extraction against whole-text
+processing and times re-extracting puzzles after editing one of their lines.
+
+    python -m benchmarks.line_memo
+"""
+import time
+
+from output_generator import extract_entities_by_line, extract_entities_from_clues, line_dedup_stats
+from repository.puzzle_repository import get_all_puzzles_with_title
+
+
+def _as_sets(entities: dict) -> dict:
+    return {label: {text: set(offsets) for text, offsets in texts.items()} for label, texts in entities.items()}
+
+
+def main():
+    clues = [clue_text for _, clue_text in get_all_puzzles_with_title()]
+    print(f"Line dedup across the DB: {line_dedup_stats(clues)}")
+
+    start_time = time.perf_counter()
+    whole_text = [extract_entities_from_clues(clue_text, use_cache=False) for clue_text in clues]
+    whole_text_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    by_line = [extract_entities_by_line(clue_text) for clue_text in clues]
+    first_run_time = time.perf_counter() - start_time
+
+    same = sum(_as_sets(a) == _as_sets(b) for a, b in zip(whole_text, by_line))
+    print(f"{same}/{len(clues)} puzzles with the same entities as whole-text processing")
+
+    # Edit the first line of every puzzle, like an author fixing a typo
+    edited_clues = [clue_text.replace(".", " .", 1) for clue_text in clues]
+    start_time = time.perf_counter()
+    for clue_text in edited_clues:
+        extract_entities_by_line(clue_text)
+    edited_run_time = time.perf_counter() - start_time
+
+    print(f"whole text: {whole_text_time:.2f}s, by line (cold): {first_run_time:.2f}s, "
+          f"by line after editing one line per puzzle: {edited_run_time:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
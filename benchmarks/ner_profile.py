@@ -0,0 +1,62 @@
+"""
+Compares the full trained model with its NER-only profile: identical entities, load time, peak RSS and throughput.
+Each profile is measured in a fresh process, so the load time and the RSS are not shared between them.
+
+    python -m benchmarks.ner_profile
+"""
+import multiprocessing
+import resource
+import time
+from typing import Dict, List
+
+import spacy
+
+from lean_model import MODEL
+from model_registry import ner_only_exclude
+from repository.puzzle_repository import get_all_puzzles_with_title
+
+
+def _measure(model: str, exclude: List[str], texts: List[str], results: multiprocessing.Queue):
+    start_time = time.perf_counter()
+    nlp = spacy.load(model, exclude=exclude)
+    load_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    docs = list(nlp.pipe(texts))
+    elapsed = time.perf_counter() - start_time
+
+    results.put({
+        "pipeline": nlp.pipe_names,
+        "load_time": load_time,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "texts_per_sec": len(texts) / elapsed,
+        "tokens_per_sec": sum(len(doc) for doc in docs) / elapsed,
+        "entities": [[(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents] for doc in docs],
+    })
+
+
+def run_profile(model: str, exclude: List[str], texts: List[str]) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(model, exclude, texts, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main(model: str = MODEL, repeat: int = 5):
+    texts = [clues for _, clues in get_all_puzzles_with_title()] * repeat
+    full = run_profile(model, [], texts)
+    lean = run_profile(model, list(ner_only_exclude(model)), texts)
+
+    print(f"{len(texts)} texts, {'identical' if full['entities'] == lean['entities'] else 'DIFFERENT'} entities")
+    print(f"{'':<10}{'load (s)':>10}{'RSS (MB)':>10}{'texts/s':>10}{'tokens/s':>12}  pipeline")
+    for name, result in (("full", full), ("ner-only", lean)):
+        print(f"{name:<10}{result['load_time']:>10.2f}{result['peak_rss_mb']:>10.0f}"
+              f"{result['texts_per_sec']:>10.1f}{result['tokens_per_sec']:>12.0f}  {result['pipeline']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Incremental re-crawls of the fixture pages of the 72 puzzles of `puzzles.db`, served locally with 50 ms of
+latency: a first full crawl, an identical re-crawl (answered with 304), and a re-crawl after 3 puzzles changed,
+2 were added and 1 was removed.
+
+    python -m benchmarks.recrawl
+"""
+import os
+import tempfile
+import time
+
+from benchmarks.fixture_server import FixtureServer, fixture_pages, render_index, render_puzzle
+from extractors.brainzilla_extractors import ZEBRA_PUZZLES_PATH, recrawl_puzzles
+from extractors.crawler import Crawler
+from repository.connection import make_database
+from repository.models import CrawledPage, Puzzle, Source
+
+LATENCY = 0.05
+
+
+def _recrawl(name: str, server: FixtureServer):
+    requests_count, not_modified_count = server.requests_count, server.not_modified_count
+    start_time = time.perf_counter()
+    with Crawler(8, requests_per_second=0) as crawler:
+        change_set = recrawl_puzzles(crawler, server.base_url)
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:<28}{elapsed:>10.2f}{server.requests_count - requests_count:>10}"
+          f"{server.not_modified_count - not_modified_count:>8}{len(change_set.new):>6}{len(change_set.changed):>9}"
+          f"{len(change_set.removed):>9}")
+
+
+def main():
+    database = make_database(os.path.join(tempfile.mkdtemp(), "puzzles.db"))
+    pages = fixture_pages()
+    with database.bind_ctx([Source, Puzzle, CrawledPage]), FixtureServer(pages, latency=LATENCY) as server:
+        database.create_tables([Source, Puzzle, CrawledPage])
+        print(f"{'crawl':<28}{'time (s)':>10}{'requests':>10}{'304':>8}{'new':>6}{'changed':>9}{'removed':>9}")
+        _recrawl("first crawl", server)
+        _recrawl("unchanged re-crawl", server)
+
+        puzzle_paths = [path for path in pages if path != ZEBRA_PUZZLES_PATH]
+        for i, path in enumerate(puzzle_paths[:3]):
+            pages[path] = render_puzzle(f"Changed {i}", "Changed puzzle", "The clues changed.")
+        for i in range(2):
+            path = f"{ZEBRA_PUZZLES_PATH}new-{i}/"
+            pages[path] = render_puzzle(f"New {i}", "New puzzle", "A new clue.")
+        del pages[puzzle_paths[-1]]
+        pages[ZEBRA_PUZZLES_PATH] = render_index([path for path in pages if path != ZEBRA_PUZZLES_PATH])
+        _recrawl("re-crawl after changes", server)
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmarks the repository queries on a synthetic DB of 1M puzzles: the SQL-side filtering and streaming of
+`repository.puzzle_repository` against the previous full-table scan with Python-side filtering.
+
+    python -m benchmarks.repository
+"""
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+from peewee import SqliteDatabase, chunked
+
+from repository.models import Puzzle, Source
+from repository.puzzle_repository import get_testing_puzzles, get_training_puzzles
+
+TESTING_PUZZLES_IDS = [11, 13, 17, 19, 27, 33, 36, 42, 47, 51, 55, 58, 61, 64, 69]
+
+
+def populate_synthetic_db(size: int, seed: int = 0):
+    """Fills the bound DB with `size` puzzles of random clues"""
+    rng = random.Random(seed)
+    words = ["Joshua", "is", "next", "to", "the", "person", "who", "likes", "Red", "shirt", "at", "one", "of",
+             "ends", "Daniel", "bought", "$900", "furniture", "wearing", "Green", "somewhere", "between"]
+    source = Source.create(name="Synthetic", domain="https://example.com", puzzles_path="/puzzles/")
+    rows = ({"title": f"Puzzle {i}",
+             "description": "Synthetic puzzle",
+             "clues": "\n".join(" ".join(rng.choices(words, k=12)) for _ in range(20)),
+             "url": f"https://example.com/puzzles/{i}/",
+             "source": source.id} for i in range(size))
+    for batch in chunked(rows, 1000):
+        with Puzzle._meta.database.atomic():
+            Puzzle.insert_many(batch).execute()
+
+
+def get_testing_puzzles_full_scan(ids: List[int]) -> List[str]:
+    """The previous implementation of `get_testing_puzzles`"""
+    all_puzzles = Puzzle.select()
+    puzzles_dict = {puzzle.id: puzzle.clues for puzzle in all_puzzles}
+    return [clue for id_, clue in puzzles_dict.items() if id_ in ids]
+
+
+def _measure(name: str, function: Callable):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    count = sum(1 for _ in function())
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<45}{count:>10}{elapsed:>10.3f}{peak / 2 ** 20:>12.1f}")
+
+
+def main(size: int = 1_000_000):
+    db_file = os.path.join(tempfile.mkdtemp(), "synthetic_puzzles.db")
+    db = SqliteDatabase(db_file, pragmas={"journal_mode": "wal", "synchronous": "off"})
+    with db.bind_ctx([Source, Puzzle]):
+        db.create_tables([Source, Puzzle])
+        start_time = time.perf_counter()
+        populate_synthetic_db(size)
+        print(f"Created {size} puzzles in {time.perf_counter() - start_time:.1f}s ({db_file})")
+
+        many_ids = random.Random(1).sample(range(1, size + 1), 10_000)
+        print(f"{'query':<45}{'rows':>10}{'time (s)':>10}{'peak (MB)':>12}")
+        _measure("full scan, 15 ids", lambda: get_testing_puzzles_full_scan(TESTING_PUZZLES_IDS))
+        _measure("get_testing_puzzles, 15 ids", lambda: get_testing_puzzles(TESTING_PUZZLES_IDS))
+        _measure("get_testing_puzzles, 10k random ids", lambda: get_testing_puzzles(many_ids))
+        _measure("get_testing_puzzles, range of 100k ids", lambda: get_testing_puzzles(range(1, 100_001)))
+        _measure("get_training_puzzles, all but 15 ids", lambda: get_training_puzzles(TESTING_PUZZLES_IDS,
+                                                                                       max_id=size + 1))
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Crawl of two sources served by two local fixture servers with 50 ms of latency, one after the other and then in
+parallel with `extractors.scheduler.crawl_sources`. The second source uses an extractor registered here, outside
+of the extractors package.
+
+    python -m benchmarks.scheduler
+"""
+import os
+import tempfile
+import time
+
+from benchmarks.fixture_server import PUZZLES_PATH, FixtureServer, fixture_pages
+from extractors.base import register_extractor
+from extractors.brainzilla_extractors import BrainzillaExtractor
+from extractors.scheduler import crawl_sources
+from repository.connection import make_database
+from repository.models import Puzzle, Source
+
+LATENCY = 0.05
+
+
+@register_extractor("Mirror")
+class MirrorExtractor(BrainzillaExtractor):
+    """A mirror of Brainzilla, with a smaller concurrency budget"""
+    max_workers = 4
+    requests_per_second = 0
+
+
+def _run(name: str, servers, parallel: bool):
+    database = make_database(os.path.join(tempfile.mkdtemp(), "puzzles.db"))
+    with database.bind_ctx([Source, Puzzle]):
+        database.create_tables([Source, Puzzle])
+        sources = [Source.create(name=source_name, domain=server.base_url, puzzles_path=PUZZLES_PATH)
+                   for source_name, server in zip(("Brainzilla", "Mirror"), servers)]
+        start_time = time.perf_counter()
+        if parallel:
+            counts = crawl_sources(sources, requests_per_second={"Brainzilla": 0})
+        else:
+            counts = [crawl_sources([source], requests_per_second={"Brainzilla": 0}) for source in sources]
+        elapsed = time.perf_counter() - start_time
+        assert Puzzle.select().count() == 2 * (len(servers[0].pages) - 1)
+    database.close()
+    print(f"{name:<12}{elapsed:>10.2f}  {counts}")
+
+
+def main():
+    pages = fixture_pages()
+    with FixtureServer(pages, latency=LATENCY) as brainzilla, FixtureServer(pages, latency=LATENCY) as mirror:
+        print(f"{'crawl':<12}{'time (s)':>10}")
+        _run("sequential", (brainzilla, mirror), parallel=False)
+        _run("parallel", (brainzilla, mirror), parallel=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Times FTS5 searches over a synthetic DB of 100k puzzles, indexed through the sync triggers.
+
+    python -m benchmarks.search
+"""
+import os
+import tempfile
+import time
+
+from peewee import SqliteDatabase
+
+from benchmarks.repository import populate_synthetic_db
+from repository.database import create_search_index
+from repository.models import Puzzle, PuzzleIndex, Source
+from repository.puzzle_repository import search_puzzles
+
+QUERIES = [("Joshua", False), ("Green shirt", True), ("furniture AND Daniel", False), ("ends OR $900", False)]
+
+
+def main(size: int = 100_000, repeat: int = 20):
+    db_file = os.path.join(tempfile.mkdtemp(), "synthetic_puzzles.db")
+    db = SqliteDatabase(db_file, pragmas={"journal_mode": "wal"})
+    with db.bind_ctx([Source, Puzzle, PuzzleIndex]):
+        db.create_tables([Source, Puzzle])
+        create_search_index(db)
+        start_time = time.perf_counter()
+        populate_synthetic_db(size)
+        print(f"Created and indexed {size} puzzles in {time.perf_counter() - start_time:.1f}s")
+
+        for query, phrase in QUERIES:
+            start_time = time.perf_counter()
+            for _ in range(repeat):
+                results = search_puzzles(query.replace("$900", '"$900"'), phrase=phrase)
+            elapsed = (time.perf_counter() - start_time) / repeat
+            print(f"{query!r:<26} phrase={phrase!s:<6} {len(results):>3} results in {elapsed * 1000:7.2f} ms")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Random `get_puzzle` lookups from 8 forked worker processes on 100k synthetic puzzles: the tuned, pooled database
+of `repository.connection` against the memory-mapped snapshot of `repository.snapshot`.
+
+    python -m benchmarks.snapshot
+"""
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.repository import populate_synthetic_db
+from repository.connection import make_database
+from repository.models import Puzzle, Source
+from repository.puzzle_repository import get_puzzle
+from repository.snapshot import create_snapshot, get_snapshot, load_snapshot
+
+WORKERS = 8
+LOOKUPS_PER_WORKER = 20_000
+PUZZLES_COUNT = 100_000
+
+
+def _database_worker(seed: int) -> int:
+    rng = random.Random(seed)
+    characters = sum(len(get_puzzle(rng.randint(1, PUZZLES_COUNT))) for _ in range(LOOKUPS_PER_WORKER))
+    Puzzle._meta.database.close()
+    return characters
+
+
+def _snapshot_worker(seed: int) -> int:
+    rng = random.Random(seed)
+    snapshot = get_snapshot()
+    return sum(len(snapshot.get_puzzle(rng.randint(1, PUZZLES_COUNT))) for _ in range(LOOKUPS_PER_WORKER))
+
+
+def _run(name: str, worker):
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=WORKERS) as executor:
+        characters = sum(executor.map(worker, range(WORKERS)))
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:<12}{WORKERS * LOOKUPS_PER_WORKER / elapsed:>14.0f}{characters:>16}")
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    database = make_database(os.path.join(directory, "puzzles.db"))
+    snapshot_file = os.path.join(directory, "puzzles.snapshot")
+    with database.bind_ctx([Source, Puzzle]):
+        database.create_tables([Source, Puzzle])
+        populate_synthetic_db(PUZZLES_COUNT)
+        start_time = time.perf_counter()
+        create_snapshot(snapshot_file)
+        print(f"Created the snapshot in {time.perf_counter() - start_time:.2f}s "
+              f"({os.path.getsize(snapshot_file) / 2 ** 20:.1f} MB)")
+
+        print(f"{'source':<12}{'lookups/s':>14}{'characters':>16}")
+        database.close()
+        _run("database", _database_worker)
+        # Mapped before the pool forks, so the workers share the pages of the parent
+        load_snapshot(snapshot_file)
+        _run("snapshot", _snapshot_worker)
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Training of the puzzle NER on the 54 annotated Brainzilla puzzles: the previous loop (one `Example` per update,
+rebuilt at every iteration) against the minibatched `custom_training.train_spacy`. Reports the wall-clock time per
+epoch and the strict entity-level F1 on the 15 annotated testing puzzles, then the same for the training with
+early stopping on a dev set, and for the retraining on all the 54 puzzles for the best number of iterations (what
+`custom_training.update_trained_model_with_new_rules` saves). The early-stopped model is trained on the 46 puzzles
+left out of the dev set; the retraining trains the saved model on all of them, at the cost of a second training.
+
+    python -m benchmarks.training [base_model] [iterations]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from spacy.training.example import Example
+
+from custom_training import build_untrained_nlp, evaluate_ner, split_dev, train_spacy
+from utils import load_data
+
+TRAINING_DATA_FILE = "training_data/54_brainzilla_puzzles_annotated.json"
+TESTING_DATA_FILE = "testing_data/brainzilla_testing_puzzles_15_adnotated.json"
+
+
+def train_spacy_per_example(nlp, data, iterations):
+    """The previous implementation of `custom_training.train_spacy`"""
+    ner = nlp.get_pipe("ner")
+    for _, annotations in data:
+        for ent in annotations.get("entities"):
+            ner.add_label(ent[2])
+
+    other_pipes = [pipe for pipe in nlp.pipe_names if pipe != "ner" and pipe != "entity_ruler"]
+    with nlp.disable_pipes(*other_pipes):
+        optimizer = nlp.create_optimizer()
+        for _ in range(iterations):
+            random.shuffle(data)
+            losses = {}
+            for text, annotations in data:
+                example = Example.from_dict(nlp.make_doc(text), annotations)
+                nlp.update([example], drop=0.2, sgd=optimizer, losses=losses)
+    return nlp
+
+
+def main(base_model: str = "en_core_web_lg", iterations: int = 10):
+    testing_data = load_data(TESTING_DATA_FILE)
+    print(f"{'training':<24}{'s/epoch':>10}{'precision':>11}{'recall':>9}{'f1':>9}")
+    for name, train in (("per example", train_spacy_per_example), ("minibatched", train_spacy)):
+        random.seed(0)
+        nlp = build_untrained_nlp(base_model)
+        start_time = time.perf_counter()
+        train(nlp, load_data(TRAINING_DATA_FILE), iterations)
+        elapsed = time.perf_counter() - start_time
+        _print_scores(name, elapsed / iterations, evaluate_ner(nlp, testing_data))
+
+    # Early stopping on a dev set split from the training data, within the 50 iterations of the real training
+    random.seed(0)
+    nlp = build_untrained_nlp(base_model)
+    training_data, dev_data = split_dev(load_data(TRAINING_DATA_FILE))
+    learning_curve_file = os.path.join(tempfile.mkdtemp(), "learning_curve.json")
+    start_time = time.perf_counter()
+    train_spacy(nlp, training_data, 50, dev_data=dev_data, learning_curve_file=learning_curve_file)
+    elapsed = time.perf_counter() - start_time
+    learning_curve = load_data(learning_curve_file)
+    epochs = learning_curve["curve"][-1]["iteration"]
+    _print_scores(f"early stop ({epochs}/50)", elapsed / epochs, evaluate_ner(nlp, testing_data))
+    print(f"Best dev iteration: {learning_curve['best']}, training time {elapsed:.1f}s")
+
+    best_iterations = learning_curve["best"]["iteration"]
+    random.seed(0)
+    nlp = build_untrained_nlp(base_model)
+    start_time = time.perf_counter()
+    train_spacy(nlp, load_data(TRAINING_DATA_FILE), best_iterations)
+    retraining_elapsed = time.perf_counter() - start_time
+    _print_scores(f"full retrain ({best_iterations})", retraining_elapsed / best_iterations,
+                  evaluate_ner(nlp, testing_data))
+    print(f"Total training time with the retraining {elapsed + retraining_elapsed:.1f}s")
+
+
+def _print_scores(name: str, seconds_per_epoch: float, scores: Dict[str, float]):
+    print(f"{name:<24}{seconds_per_epoch:>10.2f}{scores['precision']:>11.3f}{scores['recall']:>9.3f}"
+          f"{scores['f1']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,134 @@
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Tuple
+
+from output_generator import extract_entities_batch, mace4_rows, output_file_name, render_mace4, write_if_changed
+from repository.puzzle_repository import iter_puzzles
+
+CHECKPOINT_FILE = ".cache/bulk_export_checkpoint.json"
+
+logger = logging.getLogger("bulk_export")
+
+
+def _log(event: str, **fields):
+    logger.info(json.dumps({"event": event, **fields}))
+
+
+def _chunks(puzzles: Iterator[Tuple[int, str, str]], chunk_size: int) -> Iterator[List[Tuple[int, str, str]]]:
+    while True:
+        chunk = list(islice(puzzles, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_chunk(chunk: List[Tuple[int, str, str]], output_dir: str, use_cache: bool = True) -> Dict:
+    """Extracts the entities of a chunk of (id, title, clues) puzzles and writes the changed mace4 files"""
+    start_time = time.perf_counter()
+    entities_list, tokens_count = extract_entities_batch([clues for _, _, clues in chunk], use_cache=use_cache)
+    written = 0
+    for (_, title, _), entities in zip(chunk, entities_list):
+        rows = sorted(mace4_rows(entities), key=len, reverse=True)
+        if write_if_changed(output_file_name(title, output_dir), render_mace4(rows)):
+            written += 1
+    return {
+        "first_id": chunk[0][0],
+        "last_id": chunk[-1][0],
+        "puzzles": len(chunk),
+        "written": written,
+        "unchanged": len(chunk) - written,
+        "tokens": tokens_count,
+        "elapsed": round(time.perf_counter() - start_time, 3),
+    }
+
+
+def load_checkpoint(checkpoint_file: str) -> int:
+    """Returns the ID of the last puzzle exported by an interrupted run, or 0"""
+    if not os.path.isfile(checkpoint_file):
+        return 0
+    with open(checkpoint_file, "r", encoding="utf-8") as f:
+        return json.load(f)["last_id"]
+
+
+def save_checkpoint(checkpoint_file: str, last_id: int):
+    checkpoint_dir = os.path.dirname(checkpoint_file)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    temporary_file = f"{checkpoint_file}.tmp"
+    with open(temporary_file, "w", encoding="utf-8") as f:
+        json.dump({"last_id": last_id}, f)
+    os.replace(temporary_file, checkpoint_file)
+
+
+def bulk_export(output_dir: str = "./mace4_files",
+                workers: int = os.cpu_count() or 1,
+                chunk_size: int = 64,
+                checkpoint_file: str = CHECKPOINT_FILE,
+                resume: bool = True,
+                use_cache: bool = True) -> Dict:
+    """
+    Exports the mace4 files of all the puzzles of the DB. The puzzles are streamed by ID and sharded in chunks
+    across a process pool; the checkpoint stores the last ID of the exported chunks, in order, so an
+    interrupted run resumes after it.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    after_uid = load_checkpoint(checkpoint_file) if resume else 0
+    _log("export_started", after_id=after_uid, workers=workers, chunk_size=chunk_size)
+
+    totals = {"puzzles": 0, "written": 0, "unchanged": 0, "tokens": 0}
+    start_time = time.perf_counter()
+    chunks = _chunks(iter_puzzles(after_uid), chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of chunks in flight, and collect them in order so the checkpoint never
+        # skips a chunk that is still running
+        pending = deque()
+        for chunk in islice(chunks, workers * 2):
+            pending.append(executor.submit(export_chunk, chunk, output_dir, use_cache))
+        while pending:
+            result = pending.popleft().result()
+            next_chunk = next(chunks, None)
+            if next_chunk is not None:
+                pending.append(executor.submit(export_chunk, next_chunk, output_dir, use_cache))
+
+            save_checkpoint(checkpoint_file, result["last_id"])
+            for key in totals:
+                totals[key] += result[key]
+            elapsed = time.perf_counter() - start_time
+            _log("chunk_exported", **result,
+                 total_puzzles=totals["puzzles"],
+                 puzzles_per_sec=round(totals["puzzles"] / elapsed, 2),
+                 tokens_per_sec=round(totals["tokens"] / elapsed, 2))
+
+    if os.path.isfile(checkpoint_file):
+        os.remove(checkpoint_file)
+    _log("export_finished", **totals, elapsed=round(time.perf_counter() - start_time, 3))
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the mace4 files of all the puzzles of the DB")
+    parser.add_argument("--output-dir", default="./mace4_files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted run")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    bulk_export(output_dir=args.output_dir,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                checkpoint_file=args.checkpoint,
+                resume=not args.restart,
+                use_cache=not args.no_cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Annotated corpora as DocBin files.
+
+`convert_to_docbin` validates the annotated JSON data (`[[text, {"entities": [[start, end, label]]}]]`) and writes
+it as shards of tokenized Docs with their entities; `read_corpus` streams the Docs back, shard by shard, so training
+and evaluation neither re-parse the JSON nor re-tokenize the texts.
+
+    python corpus.py [--strict] [--shard-size N] [json_file ...]
+"""
+import argparse
+import glob
+import os
+from typing import Iterator, List, Optional, Tuple, Union
+
+from spacy.lang.en import English
+from spacy.tokens import Doc, DocBin, Span
+from spacy.util import filter_spans
+from spacy.vocab import Vocab
+
+from utils import load_data
+
+TRAINING_DATA_FILE = "training_data/54_brainzilla_puzzles_annotated.json"
+TESTING_DATA_FILE = "testing_data/brainzilla_testing_puzzles_15_adnotated.json"
+SHARD_SIZE = 500
+
+Entities = List[Tuple[int, int, str]]
+
+
+def annotated_spans(doc: Doc, entities: Entities) -> Tuple[List[Span], List[str]]:
+    """Returns the spans of the annotated entities of a Doc, and the errors of the invalid ones (not aligned with
+    the tokens, or overlapping another entity)"""
+    spans, errors = [], []
+    for start, end, label in entities:
+        span = doc.char_span(start, end, label=label)
+        if span is None:
+            errors.append(f"[{start}, {end}, {label}] {doc.text[start:end]!r} is not aligned with the tokens")
+        else:
+            spans.append(span)
+    spans.sort(key=lambda span: (span.start, span.end))
+    for previous, span in zip(spans, spans[1:]):
+        if span.start < previous.end:
+            errors.append(f"[{span.start_char}, {span.end_char}, {span.label_}] {span.text!r} overlaps "
+                          f"[{previous.start_char}, {previous.end_char}, {previous.label_}] {previous.text!r}")
+    return spans, errors
+
+
+def corpus_dir(json_file: str) -> str:
+    """The directory of the DocBin shards of an annotated JSON file"""
+    return os.path.splitext(json_file)[0] + ".corpus"
+
+
+def convert_to_docbin(json_file: str,
+                      output_dir: Optional[str] = None,
+                      nlp=None,
+                      shard_size: int = SHARD_SIZE,
+                      strict: bool = False) -> int:
+    """
+    Tokenizes the annotated texts of a JSON file and writes them, with their entities, as DocBin shards of
+    `shard_size` Docs. The invalid entities are reported and dropped, or raise a ValueError with `strict`.
+    Returns the number of written Docs.
+    """
+    output_dir = output_dir or corpus_dir(json_file)
+    nlp = nlp or English()
+    shards = [DocBin()]
+    errors = []
+    for i, (text, annotations) in enumerate(load_data(json_file)):
+        doc = nlp.make_doc(text)
+        spans, span_errors = annotated_spans(doc, annotations["entities"])
+        errors.extend(f"{json_file}, text {i}: {error}" for error in span_errors)
+        doc.ents = filter_spans(spans)
+        if len(shards[-1]) == shard_size:
+            shards.append(DocBin())
+        shards[-1].add(doc)
+
+    if errors:
+        if strict:
+            raise ValueError("Invalid entities:\n" + "\n".join(errors))
+        print("\n".join(f"Dropped the invalid entity of {error}" for error in errors))
+
+    os.makedirs(output_dir, exist_ok=True)
+    for old_shard in glob.glob(os.path.join(output_dir, "*.spacy")):
+        os.remove(old_shard)
+    for i, shard in enumerate(shards):
+        shard.to_disk(os.path.join(output_dir, f"{i:04d}.spacy"))
+    return sum(len(shard) for shard in shards)
+
+
+def ensure_corpus(json_file: str) -> str:
+    """Returns the corpus directory of an annotated JSON file, converting the file first if it changed since"""
+    output_dir = corpus_dir(json_file)
+    shards = glob.glob(os.path.join(output_dir, "*.spacy"))
+    if not shards or min(map(os.path.getmtime, shards)) < os.path.getmtime(json_file):
+        convert_to_docbin(json_file, output_dir)
+    return output_dir
+
+
+def read_corpus(path: str, vocab: Optional[Vocab] = None) -> Iterator[Doc]:
+    """Yields the Docs of a DocBin file, or of all the shards of a corpus directory in order"""
+    vocab = vocab or Vocab()
+    files = sorted(glob.glob(os.path.join(path, "*.spacy"))) if os.path.isdir(path) else [path]
+    for file in files:
+        yield from DocBin().from_disk(file).get_docs(vocab)
+
+
+def copy_tokens(vocab: Vocab, doc: Doc) -> Doc:
+    """A new Doc with the tokens of a corpus Doc and no annotations"""
+    return Doc(vocab, words=[token.text for token in doc], spaces=[bool(token.whitespace_) for token in doc])
+
+
+def predict_on_tokens(nlp, doc: Doc) -> Doc:
+    """
+    Runs the pipes of a pipeline on a copy of the tokens of a corpus Doc, so the predictions are aligned with its
+    gold tokens whatever the tokenizer of the pipeline.
+    """
+    predicted = copy_tokens(nlp.vocab, doc)
+    for _, pipe in nlp.pipeline:
+        predicted = pipe(predicted)
+    return predicted
+
+
+def load_corpus(json_file: str, vocab: Optional[Vocab] = None) -> List[Doc]:
+    """The Docs of an annotated JSON file, converted first if needed; call it where the data is used, not on import"""
+    return list(read_corpus(ensure_corpus(json_file), vocab))
+
+
+def text_and_entities(item: Union[Doc, Tuple[str, dict]]) -> Tuple[str, Entities]:
+    """The text and the (start, end, label) entities of a corpus Doc or of an annotated JSON item"""
+    if isinstance(item, Doc):
+        return item.text, [(ent.start_char, ent.end_char, ent.label_) for ent in item.ents]
+    text, annotations = item
+    return text, [tuple(entity) for entity in annotations["entities"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert annotated JSON files to DocBin corpora")
+    parser.add_argument("json_files", nargs="*", default=[TRAINING_DATA_FILE, TESTING_DATA_FILE])
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--strict", action="store_true", help="fail on invalid entities instead of dropping them")
+    args = parser.parse_args()
+    for json_file in args.json_files:
+        count = convert_to_docbin(json_file, shard_size=args.shard_size, strict=args.strict)
+        print(f"Wrote {count} docs to {corpus_dir(json_file)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,47 @@
+import os
 import random
-from typing import List, Tuple
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
 
 import spacy
 from spacy import displacy
 from spacy.lang.en import English
+from spacy.tokens import Doc
 from spacy.training.example import Example
-
+from spacy.util import minibatch
+from thinc.api import compounding
+
+from corpus import TESTING_DATA_FILE, TRAINING_DATA_FILE, copy_tokens, ensure_corpus, load_corpus, read_corpus, \
+    text_and_entities
+from gazetteer_matcher import load_gazetteers
+from model_registry import get_model
+from ner_eval import compute_metrics, compute_precision_recall_wrapper
 from repository.puzzle_repository import get_puzzle, get_puzzles_in_interval, get_training_puzzles, get_testing_puzzles
 from utils import load_data, save_data
 
+# Minibatch schedule of the training: the batch size grows from BATCH_START to BATCH_STOP examples,
+# multiplied by BATCH_COMPOUND after each batch
+BATCH_START = 4.0
+BATCH_STOP = 32.0
+BATCH_COMPOUND = 1.001
+DROPOUT = 0.2
+
+# Early stopping: the dev set is evaluated every EVAL_EVERY iterations, and the training stops after PATIENCE
+# evaluations without an F1 improvement of at least MIN_DELTA
+EVAL_EVERY = 5
+PATIENCE = 3
+MIN_DELTA = 0.001
+DEV_SIZE = 0.15
+# Written in the directory of the trained model
+LEARNING_CURVE_FILE = "learning_curve.json"
+
+Entity = namedtuple("Entity", "e_type start_offset end_offset")
 
-def _build_patterns_list(file: str, type_: str) -> List[dict]:
-    data = load_data(file)
+
+def _build_patterns_list(phrases: List[str], type_: str) -> List[dict]:
     patterns = []
-    for item in data:
+    for item in phrases:
         pattern = {"label": type_,
                    "pattern": item}
         patterns.append(pattern)
@@ -26,56 +54,9 @@ def generate_rules():
     # add a pipe with rules based NER
     ruler = nlp.add_pipe("entity_ruler")
 
-    persons_patterns = _build_patterns_list("entity_rules/persons.json", "PERSON")
-    ruler.add_patterns(persons_patterns)
-
-    fruits_patterns = _build_patterns_list("entity_rules/fruits.json", "FRUIT")
-    ruler.add_patterns(fruits_patterns)
-
-    products_patterns = _build_patterns_list("entity_rules/products.json", "PRODUCT")
-    ruler.add_patterns(products_patterns)
-
-    animals_patterns = _build_patterns_list("entity_rules/animals.json", "ANIMAL")
-    ruler.add_patterns(animals_patterns)
-
-    colors_patterns = _build_patterns_list("entity_rules/colors.json", "COLOR")
-    ruler.add_patterns(colors_patterns)
-
-    professions_patterns = _build_patterns_list("entity_rules/professions.json", "PROFESSION")
-    ruler.add_patterns(professions_patterns)
-
-    gpes_patterns = _build_patterns_list("entity_rules/gpes.json", "GPE")
-    ruler.add_patterns(gpes_patterns)
-
-    orgs_patterns = _build_patterns_list("entity_rules/orgs.json", "ORG")
-    ruler.add_patterns(orgs_patterns)
-
-    norp_patterns = _build_patterns_list("entity_rules/nationalities.json", "NORP")
-    ruler.add_patterns(norp_patterns)
-
-    hobbies_patterns = _build_patterns_list("entity_rules/hobbies.json", "HOBBY")
-    ruler.add_patterns(hobbies_patterns)
-
-    categories_patterns = _build_patterns_list("entity_rules/categories.json", "CATEGORY")
-    ruler.add_patterns(categories_patterns)
-
-    locations_patterns = _build_patterns_list("entity_rules/locations.json", "LOC")
-    ruler.add_patterns(locations_patterns)
-
-    dates_patterns = _build_patterns_list("entity_rules/dates.json", "DATE")
-    ruler.add_patterns(dates_patterns)
-
-    times_patterns = _build_patterns_list("entity_rules/times.json", "TIME")
-    ruler.add_patterns(times_patterns)
-
-    cardinals_patterns = _build_patterns_list("entity_rules/cardinals.json", "CARDINAL")
-    ruler.add_patterns(cardinals_patterns)
-
-    quantities_patterns = _build_patterns_list("entity_rules/quantities.json", "QUANTITY")
-    ruler.add_patterns(quantities_patterns)
-
-    woa_patterns = _build_patterns_list("entity_rules/work_of_art.json", "WORK_OF_ART")
-    ruler.add_patterns(woa_patterns)
+    # the same gazetteers as the GazetteerMatcher: a phrase only has the label of the last file listing it
+    for label, phrases in load_gazetteers():
+        ruler.add_patterns(_build_patterns_list(phrases, label))
 
     # save the model containing the `entity_ruler` pipe
     nlp.to_disk("models/puzzle_ner")
@@ -138,45 +119,138 @@ def pretty_print_ner(doc: str):
         print(e)
 
 
-def train_spacy(nlp, data, iterations):
-    TRAIN_DATA = data
-
+def build_examples(nlp, data) -> List[Example]:
+    """
+    Builds the training Examples once for the whole training, from corpus Docs (see `corpus.read_corpus`) or
+    from annotated (text, {"entities": [...]}) items, which are tokenized and aligned here.
+    """
+    examples = []
+    for item in data:
+        if isinstance(item, Doc):
+            # Already tokenized: the predicted Doc only copies the tokens
+            examples.append(Example(copy_tokens(nlp.vocab, item), item))
+        else:
+            text, annotations = item
+            examples.append(Example.from_dict(nlp.make_doc(text), annotations))
+    return examples
+
+
+def split_dev(data: list, dev_size: float = DEV_SIZE, seed: int = 0) -> Tuple[list, list]:
+    """Splits the annotated data into a training and a dev set, the same way for a given seed"""
+    data = list(data)
+    random.Random(seed).shuffle(data)
+    dev_count = max(1, int(len(data) * dev_size))
+    return data[dev_count:], data[:dev_count]
+
+
+def train_spacy(nlp, data, iterations,
+                batch_start: float = BATCH_START,
+                batch_stop: float = BATCH_STOP,
+                batch_compound: float = BATCH_COMPOUND,
+                drop: float = DROPOUT,
+                dev_data=None,
+                eval_every: int = EVAL_EVERY,
+                patience: int = PATIENCE,
+                min_delta: float = MIN_DELTA,
+                learning_curve_file: Optional[str] = None):
+    """
+    Trains the ner of the pipeline for at most `iterations` iterations. With `dev_data`, the dev set is evaluated
+    every `eval_every` iterations (strict entity-level P/R/F, see `evaluate_ner`), the training stops early once
+    the F1 has not improved for `patience` evaluations, and the ner is restored to its best evaluated weights.
+    The learning curve is written to `learning_curve_file` as JSON.
+    """
     ner = nlp.get_pipe("ner")
 
-    for _, annotations in TRAIN_DATA:
-        for ent in annotations.get("entities"):
-            ner.add_label(ent[2])
+    examples = build_examples(nlp, data)
+    for example in examples:
+        for ent in example.reference.ents:
+            ner.add_label(ent.label_)
 
+    learning_curve = []
+    best = None
+    best_weights = None
+    evaluations_without_improvement = 0
+    start_time = time.perf_counter()
     other_pipes = [pipe for pipe in nlp.pipe_names if pipe != "ner" and pipe != "entity_ruler"]
     with nlp.disable_pipes(*other_pipes):
         optimizer = nlp.create_optimizer()
+        # The schedule continues across the iterations, so the first updates are small and the later ones large
+        batch_sizes = compounding(batch_start, batch_stop, batch_compound)
         for itn in range(iterations):
             print(f"Starting iteration {str(itn)}")
-            random.shuffle(TRAIN_DATA)
+            random.shuffle(examples)
             losses = {}
-            for text, annotations in TRAIN_DATA:
-                # create Example
-                doc = nlp.make_doc(text)
-                example = Example.from_dict(doc, annotations)
+            for batch in minibatch(examples, size=batch_sizes):
                 # Update the model
-                nlp.update([example],
-                           drop=0.2,
+                nlp.update(batch,
+                           drop=drop,
                            sgd=optimizer,
                            losses=losses
                            )
             print(losses)
+
+            if dev_data is None or ((itn + 1) % eval_every and itn + 1 != iterations):
+                continue
+            scores = evaluate_ner(nlp, dev_data)
+            point = {"iteration": itn + 1, "loss": losses.get("ner", 0.0), **scores,
+                     "elapsed": round(time.perf_counter() - start_time, 3)}
+            learning_curve.append(point)
+            print(f"Dev set: {point}")
+            if best is None or scores["f1"] >= best["f1"] + min_delta:
+                best = point
+                # Only the ner is trained, so its weights are the whole checkpoint
+                best_weights = ner.to_bytes()
+                evaluations_without_improvement = 0
+            else:
+                evaluations_without_improvement += 1
+                if evaluations_without_improvement >= patience:
+                    print(f"Stopping at iteration {itn + 1}: no F1 improvement in {patience} evaluations")
+                    break
+
+    if best_weights is not None and best is not learning_curve[-1]:
+        print(f"Restoring the best weights, of iteration {best['iteration']}")
+        ner.from_bytes(best_weights)
+    if learning_curve_file:
+        save_data(learning_curve_file, {"best": best, "curve": learning_curve})
     return nlp
 
 
+def evaluate_ner(nlp, data) -> Dict[str, float]:
+    """
+    Entity-level precision, recall and F1 of a pipeline on corpus Docs or annotated texts, with the strict schema
+    of `ner_eval` (same boundaries and same label).
+    """
+    data = [text_and_entities(item) for item in data]
+    tags = {label for _, entities in data for _, _, label in entities}
+    counts = {"correct": 0, "incorrect": 0, "partial": 0, "missed": 0, "spurious": 0, "possible": 0, "actual": 0}
+    docs = nlp.pipe([text for text, _ in data])
+    for (_, entities), doc in zip(data, docs):
+        true = [Entity(label, start, end) for start, end, label in entities]
+        pred = [Entity(ent.label_, ent.start_char, ent.end_char) for ent in doc.ents]
+        results, _ = compute_metrics(true, pred, tags)
+        for metric in counts:
+            counts[metric] += results["strict"][metric]
+    strict = compute_precision_recall_wrapper({"strict": counts})["strict"]
+    precision, recall = strict["precision"], strict["recall"]
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def build_untrained_nlp(base_model: str = "en_core_web_lg"):
+    """Loads the base pipeline with the `models/puzzle_ner` entity_ruler added before its ner"""
+    untrained_custom_nlp = spacy.load("models/puzzle_ner")
+    untrained_nlp = spacy.load(base_model)
+    untrained_nlp.add_pipe("entity_ruler", source=untrained_custom_nlp, before="ner")
+    return untrained_nlp
+
+
 def update_trained_model_with_new_rules():
     # RUN THIS if you've updated the ANNOTATED data (entity_rules/*.json)
     # This will create a new model called `puzzle_ner` and will save it to disk
     # Then we will create an enhanced nlp pipe from the original one by adding the custom rules
     generate_rules()
-    untrained_custom_nlp = spacy.load("models/puzzle_ner")
-    # untrained_nlp = spacy.load("en_core_web_sm")
-    untrained_nlp = spacy.load("en_core_web_lg")
-    untrained_nlp.add_pipe("entity_ruler", source=untrained_custom_nlp, before="ner")
+    # untrained_nlp = build_untrained_nlp("en_core_web_sm")
+    untrained_nlp = build_untrained_nlp("en_core_web_lg")
 
     # Generates a Train DATA file with the first 10 clues and the found entities
     # clues_list = get_puzzles_in_interval(1, 10)
@@ -190,12 +264,34 @@ def update_trained_model_with_new_rules():
     training_data_file = "training_data/54_brainzilla_puzzles.json"
     create_train_data_file(untrained_nlp, clues_list, training_data_file)
 
-    TRAIN_DATA = load_data("training_data/54_brainzilla_puzzles_annotated.json")
-    # print(TRAIN_DATA)
-
-    # TRAIN data and create a new nlp model
-    result_nlp = train_spacy(untrained_nlp, TRAIN_DATA, 50)
-    result_nlp.to_disk("models/ner_brainzilla_puzzles_model_50_lg_final")
+    model_dir = "models/ner_brainzilla_puzzles_model_50_lg_final"
+    os.makedirs(model_dir, exist_ok=True)
+    learning_curve_file = os.path.join(model_dir, LEARNING_CURVE_FILE)
+
+    # Find the number of iterations with the best F1 on a dev set held out of the training data...
+    TRAIN_DATA, DEV_DATA = split_dev(list(read_corpus(ensure_corpus(TRAINING_DATA_FILE), untrained_nlp.vocab)))
+    early_stopped_nlp = train_spacy(untrained_nlp, TRAIN_DATA, 50, dev_data=DEV_DATA,
+                                    learning_curve_file=learning_curve_file)
+    best = load_data(learning_curve_file)["best"]
+    # The dev puzzles end up in the training data of the final model, so both are compared on the testing puzzles
+    TESTING_DATA = load_corpus(TESTING_DATA_FILE, untrained_nlp.vocab)
+    early_stopped_scores = evaluate_ner(early_stopped_nlp, TESTING_DATA)
+    if not best or not best["iteration"]:
+        print(f"No best iteration on the dev set, saving the early-stopped model: "
+              f"testing set F1 {early_stopped_scores['f1']:.3f}")
+        early_stopped_nlp.to_disk(model_dir)
+        return
+
+    # ...then TRAIN a new nlp model on all the annotated puzzles for that many iterations, so the dev puzzles
+    # are not lost to the final model
+    print(f"Training on all the annotated puzzles for {best['iteration']} iterations")
+    full_nlp = build_untrained_nlp("en_core_web_lg")
+    TRAIN_DATA = list(read_corpus(ensure_corpus(TRAINING_DATA_FILE), full_nlp.vocab))
+    result_nlp = train_spacy(full_nlp, TRAIN_DATA, best["iteration"])
+    result_scores = evaluate_ner(result_nlp, TESTING_DATA)
+    print(f"Testing set F1: {result_scores['f1']:.3f} retrained on all the puzzles, "
+          f"{early_stopped_scores['f1']:.3f} early-stopped at iteration {best['iteration']}")
+    result_nlp.to_disk(model_dir)
 
 
 def test_model(input_puzzle: str, model: str):
@@ -203,7 +299,7 @@ def test_model(input_puzzle: str, model: str):
     This will run the trained model over a given input and will display the result at http://0.0.0.0:5001
     :return:
     """
-    trained_nlp = spacy.load(model)
+    trained_nlp = get_model(model)
     doc = trained_nlp(input_puzzle)
     entities = [(x.text, x.label_) for x in doc.ents]
     print(entities)
@@ -216,7 +312,7 @@ def test_model_on_testing_list(model: str):
     testing_puzzles_ids = [11, 13, 17, 19, 27, 33, 36, 42, 47, 51, 55, 58, 61, 64, 69]
     clues_list = get_testing_puzzles(ids=testing_puzzles_ids)
     docs = []
-    trained_nlp = spacy.load(model)
+    trained_nlp = get_model(model)
     for clue in clues_list:
         doc = trained_nlp(clue)
         docs.append(doc)
@@ -224,7 +320,7 @@ def test_model_on_testing_list(model: str):
 
 
 def generate_testing_data_file(model):
-    trained_nlp = spacy.load(model)
+    trained_nlp = get_model(model)
     testing_puzzles_ids = [11, 13, 17, 19, 27, 33, 36, 42, 47, 51, 55, 58, 61, 64, 69]
     clues_list = get_testing_puzzles(testing_puzzles_ids)
     create_train_data_file(trained_nlp, clues_list, "testing_data/testing_15_brainzilla_puzzles_unannotated.json")
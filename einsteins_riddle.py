@@ -1,12 +1,11 @@
 import re
 from collections import Counter
 
-import en_core_web_sm
 import requests
 from bs4 import BeautifulSoup
 from spacy import displacy
 
-nlp = en_core_web_sm.load()
+from model_registry import get_model
 
 
 def url_to_string(url):
@@ -18,10 +17,8 @@ def url_to_string(url):
     return " ".join(re.split(r'[\n\t]+', soup.get_text()))
 
 
-url = "https://udel.edu/~os/riddle.html#:~:text=Einstein's%20riddle&text=There%20are%205%20houses%20in" \
-      ",or%20drink%20the%20same%20beverage."
-einstein_riddle_text = url_to_string(url)
-# article = nlp(einstein_riddle_text)
+RIDDLE_URL = "https://udel.edu/~os/riddle.html#:~:text=Einstein's%20riddle&text=There%20are%205%20houses%20in" \
+             ",or%20drink%20the%20same%20beverage."
 
 riddle_text = """
 There are 5 houses in five different colors.
@@ -47,16 +44,23 @@ the German smokes Prince
 the Norwegian lives next to the blue house
 the man who smokes blend has a neighbor who drinks water"""
 
-article = nlp(riddle_text)
 
-displacy.render(article, jupyter=True, style='ent')
+def main():
+    einstein_riddle_text = url_to_string(RIDDLE_URL)
+    # article = nlp(einstein_riddle_text)
 
-print("Labels of found entities:")
-labels = [x.label_ for x in article.ents]
-print(Counter(labels))
+    article = get_model("en_core_web_sm")(riddle_text)
 
-print("Found entities by their types:")
-entities = [(x.text, x.label_) for x in article.ents]
-print(Counter(entities))
+    displacy.render(article, jupyter=True, style='ent')
 
+    print("Labels of found entities:")
+    labels = [x.label_ for x in article.ents]
+    print(Counter(labels))
 
+    print("Found entities by their types:")
+    entities = [(x.text, x.label_) for x in article.ents]
+    print(Counter(entities))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+CACHE_FILE = ".cache/entities.sqlite"
+
+# Model files whose content is hashed; the other files (weights, vectors) are fingerprinted by size and mtime
+CONTENT_HASHED_FILES = {"meta.json", "config.cfg", os.path.join("entity_ruler", "patterns.jsonl")}
+
+
+def model_fingerprint(model: str) -> str:
+    """
+    Returns a fingerprint of a saved model directory, which changes whenever the model is retrained:
+    the content of `meta.json`, `config.cfg` and the entity_ruler patterns, plus the size and mtime of
+    every other file (weights, vectors). Package names (e.g. `en_core_web_sm`) are fingerprinted by name.
+    """
+    fingerprint = hashlib.sha256()
+    if not os.path.isdir(model):
+        fingerprint.update(model.encode("utf-8"))
+        return fingerprint.hexdigest()
+
+    for root, dirs, files in os.walk(model):
+        dirs.sort()
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            relative_path = os.path.relpath(path, model)
+            fingerprint.update(relative_path.encode("utf-8"))
+            if relative_path in CONTENT_HASHED_FILES:
+                with open(path, "rb") as f:
+                    fingerprint.update(f.read())
+            else:
+                stat = os.stat(path)
+                fingerprint.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return fingerprint.hexdigest()
+
+
+def _serialize(entities: dict) -> str:
+    return json.dumps(entities, ensure_ascii=False, sort_keys=True)
+
+
+def _deserialize(data: str) -> dict:
+    """Rebuilds the nested {label: {text: [(start, end)]}} defaultdict returned by the NER"""
+    result = defaultdict(lambda: defaultdict(list))
+    for label, texts in json.loads(data).items():
+        for text, offsets in texts.items():
+            result[label][text].extend(tuple(offset) for offset in offsets)
+    return result
+
+
+class EntityCache:
+    """
+    Two-level cache of the entities extracted from a clue text: an in-process LRU in front of an on-disk
+    SQLite store. The entries are keyed by the hash of the clue text and by the fingerprint of the model, so
+    retraining the model invalidates them. The models share the store: opening the cache of a model only drops
+    the entries of its previous fingerprints, and the least recently used entries of all the models are evicted.
+    """
+
+    def __init__(self, model: str, cache_file: str = CACHE_FILE, max_memory_items: int = 1024,
+                 max_disk_items: int = 100_000):
+        self.model = model
+        self.fingerprint = model_fingerprint(model)
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(cache_file, check_same_thread=False, timeout=30)
+        # WAL lets the worker processes of a bulk run read the cache while one of them writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(entities)")]
+            if columns and "model" not in columns:
+                # Store written before the entries were tagged with their model; it is only a cache
+                self._db.execute("DROP TABLE entities")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entities ("
+                             "key TEXT PRIMARY KEY, model TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+                             "entities TEXT NOT NULL, last_used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entities_last_used ON entities (last_used)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entities_model ON entities (model)")
+            self._db.execute("DELETE FROM entities WHERE model = ? AND fingerprint != ?",
+                             (self.model, self.fingerprint))
+        self._disk_items = self._count_disk_items()
+
+    def _count_disk_items(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entities").fetchone()[0]
+
+    def _key(self, clue_text: str) -> str:
+        return hashlib.sha256(f"{self.fingerprint}\0{clue_text}".encode("utf-8")).hexdigest()
+
+    def get(self, clue_text: str) -> Optional[dict]:
+        """Returns the cached entities of a clue text, or None on a miss"""
+        key = self._key(clue_text)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return _deserialize(data)
+
+            row = self._db.execute("SELECT entities FROM entities WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self._db:
+                self._db.execute("UPDATE entities SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return _deserialize(row[0])
+
+    def put(self, clue_text: str, entities: dict):
+        """Stores the entities of a clue text in both cache levels"""
+        key = self._key(clue_text)
+        data = _serialize(entities)
+        with self._lock:
+            self._remember(key, data)
+            with self._db:
+                now = time.time()
+                inserted = self._db.execute("INSERT OR IGNORE INTO entities "
+                                            "(key, model, fingerprint, entities, last_used) VALUES (?, ?, ?, ?, ?)",
+                                            (key, self.model, self.fingerprint, data, now)).rowcount
+                if not inserted:
+                    self._db.execute("UPDATE entities SET entities = ?, last_used = ? WHERE key = ?",
+                                     (data, now, key))
+                self._disk_items += inserted
+                if self._disk_items > self.max_disk_items:
+                    self._evict_from_disk()
+
+    def _remember(self, key: str, data: str):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_from_disk(self):
+        """Deletes the least recently used entries, going 10% below the size limit to amortize the eviction"""
+        target = int(self.max_disk_items * 0.9)
+        self._db.execute("DELETE FROM entities WHERE key IN "
+                         "(SELECT key FROM entities ORDER BY last_used LIMIT ?)", (self._disk_items - target,))
+        self._disk_items = target
+
+    def clear(self):
+        """Drops the entries of this model; the other models keep theirs"""
+        with self._lock:
+            self._memory.clear()
+            with self._db:
+                self._db.execute("DELETE FROM entities WHERE model = ?", (self.model,))
+            self._disk_items = self._count_disk_items()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+            "disk_items": self._disk_items,
+        }
+
+
+_caches: Dict[str, EntityCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(model: str) -> EntityCache:
+    """Returns the entity cache of a model, shared by every caller of the process"""
+    with _caches_lock:
+        cache = _caches.get(model)
+        if cache is None:
+            cache = EntityCache(model)
+            _caches[model] = cache
+    return cache
+
+
+class LineEntityMemo:
+    """
+    In-process LRU of the entities found in single clue lines, as (start, end, label) offsets relative to
+    the line. Brainzilla clue sets repeat many lines, so a line is only processed by the NER the first time.
+    """
+
+    def __init__(self, max_items: int = 100_000):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._lines = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, line: str) -> Optional[List[Tuple[int, int, str]]]:
+        with self._lock:
+            spans = self._lines.get(line)
+            if spans is None:
+                self.misses += 1
+                return None
+            self._lines.move_to_end(line)
+            self.hits += 1
+            return spans
+
+    def put(self, line: str, spans: List[Tuple[int, int, str]]):
+        with self._lock:
+            self._lines[line] = spans
+            self._lines.move_to_end(line)
+            while len(self._lines) > self.max_items:
+                self._lines.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "items": len(self._lines)}
+
+
+_line_memos: Dict[str, LineEntityMemo] = {}
+
+
+def get_line_memo(model: str) -> LineEntityMemo:
+    """Returns the line memo of a model, shared by every caller of the process"""
+    with _caches_lock:
+        memo = _line_memos.get(model)
+        if memo is None:
+            memo = LineEntityMemo()
+            _line_memos[model] = memo
+    return memo
@@ -0,0 +1,141 @@
+from array import array
+from collections import defaultdict
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Filters applied when the entities become mace4 rows
+EXCLUDED_LABELS = {"ORDINAL"}  # eliminate ordinals as NE
+EXCLUDED_TEXTS = {"one"}  # eliminate `one` as NE
+
+
+class StringTable:
+    """Interns strings to integer IDs, so each label and entity text is stored once per table"""
+    __slots__ = ("_ids", "_strings")
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+
+    def intern(self, string: str) -> int:
+        id_ = self._ids.get(string)
+        if id_ is None:
+            id_ = len(self._strings)
+            self._ids[string] = id_
+            self._strings.append(string)
+        return id_
+
+    def id_of(self, string: str) -> Optional[int]:
+        """Returns the ID of an already interned string, or None"""
+        return self._ids.get(string)
+
+    def __getitem__(self, id_: int) -> str:
+        return self._strings[id_]
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+class EntityResult(Mapping):
+    """
+    Compact form of the entities of a puzzle: one row per entity, stored in four `array('i')` columns
+    (label ID, text ID, start, end). It is a read-only mapping with the same {label: {text: [(start, end)]}}
+    view as `output_generator.extract_entities_from_clues`, built on access.
+
+    The labels and texts are interned in the `strings` table of the result, or in a table shared by a batch of
+    results, so they are freed with the results. Pickled results carry their strings, not the IDs.
+    """
+    __slots__ = ("strings", "labels", "texts", "starts", "ends")
+
+    def __init__(self, strings: Optional[StringTable] = None):
+        self.strings = strings if strings is not None else StringTable()
+        self.labels = array("i")
+        self.texts = array("i")
+        self.starts = array("i")
+        self.ends = array("i")
+
+    @classmethod
+    def from_doc(cls, doc, strings: Optional[StringTable] = None) -> "EntityResult":
+        result = cls(strings)
+        for ent in doc.ents:
+            result.append(ent.label_, ent.text, ent.start_char, ent.end_char)
+        return result
+
+    @classmethod
+    def from_entities(cls, entities: Mapping, strings: Optional[StringTable] = None) -> "EntityResult":
+        """Converts the nested dict returned by `extract_entities_from_clues`"""
+        result = cls(strings)
+        for label, texts in entities.items():
+            for text, offsets in texts.items():
+                for start, end in offsets:
+                    result.append(label, text, start, end)
+        return result
+
+    def append(self, label: str, text: str, start: int, end: int):
+        self.labels.append(self.strings.intern(label))
+        self.texts.append(self.strings.intern(text))
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def rows(self) -> Iterator[Tuple[str, str, int, int]]:
+        """The (label, text, start, end) of the entities"""
+        strings = self.strings
+        for label_id, text_id, start, end in zip(self.labels, self.texts, self.starts, self.ends):
+            yield strings[label_id], strings[text_id], start, end
+
+    @classmethod
+    def _from_rows(cls, rows: List[Tuple[str, str, int, int]]) -> "EntityResult":
+        result = cls()
+        for row in rows:
+            result.append(*row)
+        return result
+
+    def __reduce__(self):
+        # The IDs only mean something with this table, which may be shared by a whole batch
+        return EntityResult._from_rows, (list(self.rows()),)
+
+    def _label_ids(self) -> List[int]:
+        """The label IDs in the order of their first entity"""
+        return list(dict.fromkeys(self.labels))
+
+    def __getitem__(self, label: str) -> Dict[str, List[Tuple[int, int]]]:
+        label_id = self.strings.id_of(label)
+        texts = {}
+        if label_id is not None:
+            for row, row_label_id in enumerate(self.labels):
+                if row_label_id == label_id:
+                    texts.setdefault(self.strings[self.texts[row]], []).append((self.starts[row], self.ends[row]))
+        if not texts:
+            raise KeyError(label)
+        return texts
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.strings[label_id] for label_id in self._label_ids())
+
+    def __len__(self) -> int:
+        return len(self._label_ids())
+
+    def to_dict(self) -> dict:
+        """The nested defaultdict returned by `extract_entities_from_clues`"""
+        result = defaultdict(lambda: defaultdict(list))
+        for label, text, start, end in self.rows():
+            result[label][text].append((start, end))
+        return result
+
+    def to_mace4_rows(self) -> List[List[str]]:
+        """The unique entity texts of each label, as `output_generator.generate_output_file` writes them"""
+        rows = {}
+        for label_id, text_id in zip(self.labels, self.texts):
+            row = rows.setdefault(label_id, {})
+            row[text_id] = None
+        strings = self.strings
+        result = []
+        for label_id, text_ids in rows.items():
+            if strings[label_id] in EXCLUDED_LABELS:
+                continue
+            texts = [strings[text_id] for text_id in text_ids if strings[text_id] not in EXCLUDED_TEXTS]
+            if texts:
+                result.append(texts)
+        return result
+
+    def __repr__(self) -> str:
+        return f"EntityResult({dict(self.items())})"
@@ -0,0 +1,122 @@
+"""
+Offline archive of the crawled pages, so the extractors can be re-run without fetching the pages again.
+
+A crawl writes two files in the archive directory, in the spirit of WARC:
+
+    <crawl_id>.pages        the zlib-compressed bodies, each distinct body stored once (content-addressed)
+    <crawl_id>.index.jsonl  one record per fetched page: url, SHA-256 of the body, offset and length in the
+                            pages file, encoding, HTTP validators and fetch time
+
+`replay` runs a parse function over archived pages in a pool of processes.
+"""
+import datetime
+import glob
+import hashlib
+import json
+import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple, TypeVar
+
+ARCHIVE_DIR = ".cache/page_archive"
+INDEX_SUFFIX = ".index.jsonl"
+PAGES_SUFFIX = ".pages"
+
+T = TypeVar("T")
+
+
+class PageArchive:
+    """Archive of the pages of one crawl; `add` can be called from several threads"""
+
+    def __init__(self, archive_dir: str = ARCHIVE_DIR, crawl_id: Optional[str] = None):
+        os.makedirs(archive_dir, exist_ok=True)
+        self.crawl_id = crawl_id or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.index_file = os.path.join(archive_dir, f"{self.crawl_id}{INDEX_SUFFIX}")
+        self._pages = open(os.path.join(archive_dir, f"{self.crawl_id}{PAGES_SUFFIX}"), "ab")
+        self._index = open(self.index_file, "a", encoding="utf-8")
+        self._locations: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, url: str, content: bytes, encoding: Optional[str] = None,
+            headers: Optional[Mapping[str, str]] = None) -> str:
+        """Archives the body of a page; returns its SHA-256"""
+        digest = hashlib.sha256(content).hexdigest()
+        headers = headers or {}
+        with self._lock:
+            location = self._locations.get(digest)
+            if location is None:
+                data = zlib.compress(content)
+                location = (self._pages.tell(), len(data))
+                self._pages.write(data)
+                self._locations[digest] = location
+            record = {"url": url, "sha256": digest, "offset": location[0], "length": location[1],
+                      "encoding": encoding, "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+                      "fetched_at": datetime.datetime.now().isoformat()}
+            self._index.write(json.dumps(record) + "\n")
+        return digest
+
+    def close(self):
+        for file in (self._pages, self._index):
+            file.flush()
+            os.fsync(file.fileno())
+            file.close()
+
+    def __enter__(self) -> "PageArchive":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArchiveReader:
+    """Reads the pages archived by a crawl; the last record of a url wins"""
+
+    def __init__(self, index_file: str):
+        self.index_file = index_file
+        self.records: Dict[str, dict] = {}
+        with open(index_file, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.records[record["url"]] = record
+        self._pages = open(index_file[:-len(INDEX_SUFFIX)] + PAGES_SUFFIX, "rb")
+
+    def read(self, url: str) -> str:
+        """Returns the text of an archived page; raises KeyError if the url was not archived"""
+        record = self.records[url]
+        data = os.pread(self._pages.fileno(), record["length"], record["offset"])
+        return zlib.decompress(data).decode(record["encoding"] or "utf-8", errors="replace")
+
+    def close(self):
+        self._pages.close()
+
+
+def latest_archive(archive_dir: str = ARCHIVE_DIR) -> str:
+    """Returns the index file of the last crawl archived in the directory"""
+    index_files = sorted(glob.glob(os.path.join(archive_dir, f"*{INDEX_SUFFIX}")), key=os.path.getmtime)
+    if not index_files:
+        raise Exception(f"There is no archived crawl in {archive_dir}")
+    return index_files[-1]
+
+
+_reader: Optional[ArchiveReader] = None
+
+
+def _open_reader(index_file: str):
+    global _reader
+    _reader = ArchiveReader(index_file)
+
+
+def _replay_page(parse: Callable[[str, str], T], url: str) -> T:
+    return parse(_reader.read(url), url)
+
+
+def replay(index_file: str, parse: Callable[[str, str], T], urls: Iterable[str],
+           workers: int = os.cpu_count() or 1, chunk_size: int = 16) -> List[T]:
+    """
+    Runs `parse(html, url)` over the archived pages of the given urls in a pool of processes, each reading the
+    archive on its own; returns the results in the order of the urls. `parse` must be a module-level function.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_reader, initargs=(index_file,)) as executor:
+        return list(executor.map(partial(_replay_page, parse), urls, chunksize=chunk_size))
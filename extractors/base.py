@@ -0,0 +1,64 @@
+"""
+Extractors of the puzzle sources. An extractor lists the puzzle pages of a source and parses each of them into a
+`Puzzle`; it is registered under the name of its `Source` row with `register_extractor`. The extractor modules of
+this package are imported by `load_extractors`, so adding a source only needs a new module.
+"""
+import importlib
+import pkgutil
+from abc import ABC, abstractmethod
+from typing import Dict, List, Type
+
+from extractors.crawler import Crawler
+from repository.models import Puzzle, Source
+
+_extractors: Dict[str, Type["Extractor"]] = {}
+
+
+class Extractor(ABC):
+    """Extracts the puzzles of one source, fetching its pages with the given crawler"""
+    # Default concurrency budget of the source: parallel requests, and requests per second to its host
+    max_workers = 4
+    requests_per_second = 5.0
+
+    def __init__(self, source: Source, crawler: Crawler):
+        self.source = source
+        self.crawler = crawler
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.source.domain}{self.source.puzzles_path}"
+
+    @abstractmethod
+    def list_pages(self) -> List[str]:
+        """Returns the urls of the puzzle pages of the source"""
+
+    @abstractmethod
+    def parse_puzzle(self, html: str, url: str) -> Puzzle:
+        """Parses a puzzle page"""
+
+    def extract_puzzle(self, url: str) -> Puzzle:
+        puzzle = self.parse_puzzle(self.crawler.fetch(url).text, url)
+        puzzle.source_id = self.source.id
+        return puzzle
+
+
+def register_extractor(source_name: str):
+    """Class decorator registering an extractor for the sources with the given name"""
+    def register(extractor_class: Type[Extractor]) -> Type[Extractor]:
+        _extractors[source_name] = extractor_class
+        return extractor_class
+    return register
+
+
+def load_extractors():
+    """Imports the modules of the `extractors` package, which register their extractors"""
+    package = importlib.import_module("extractors")
+    for module in pkgutil.iter_modules(package.__path__):
+        importlib.import_module(f"extractors.{module.name}")
+
+
+def get_extractor_class(source: Source) -> Type[Extractor]:
+    extractor_class = _extractors.get(source.name)
+    if extractor_class is None:
+        raise Exception(f"There is no extractor registered for the source {source.name}")
+    return extractor_class
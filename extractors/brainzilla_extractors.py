@@ -1,29 +1,33 @@
+import datetime
+import os
 import re
 from collections import Counter
-from typing import List
+from typing import Dict, List, Optional
 
-import en_core_web_sm
 import requests
-from bs4 import BeautifulSoup
 from spacy import displacy
 from spacy.tokens.doc import Doc
 from spacy.tokens.span import Span
 
+from extractors.archive import ArchiveReader, replay
+from extractors.base import Extractor, register_extractor
+from extractors.crawler import ChangeSet, Crawler, PageValidators
+from extractors.html_parsing import PAGES_STRAINER, PUZZLE_STRAINER, make_soup
+from model_registry import get_model
 from repository.database import create_database
+from repository.crawl_repository import get_page_validators, save_page_validators
 from repository.models import Puzzle, Source
-from repository.puzzle_repository import get_puzzle
-
-nlp = en_core_web_sm.load()
+from repository.puzzle_repository import get_or_create_source, get_puzzle, iter_source_puzzle_urls, \
+    iter_updated_puzzle_urls, upsert_puzzles
 
 DOMAIN = "https://www.brainzilla.com"
 ZEBRA_PUZZLES_PATH = "/logic/zebra/"
 SOURCE_ID = 1
 
 
-def extract_pages() -> List[str]:
-    start_url = f"{DOMAIN}{ZEBRA_PUZZLES_PATH}"
-    html_doc = requests.get(start_url)
-    soup = BeautifulSoup(html_doc.text, 'html.parser')
+def parse_pages(html: str) -> List[str]:
+    """Returns the paths of the puzzle pages listed on the zebra puzzles page"""
+    soup = make_soup(html, PAGES_STRAINER)
     pages_paths = soup.find('div', class_="col-lg-8").findAll('li')
     pages = []
     for page in pages_paths:
@@ -31,9 +35,8 @@ def extract_pages() -> List[str]:
     return pages
 
 
-def extract_puzzle(puzzle_url: str) -> Puzzle:
-    html_doc = requests.get(puzzle_url)
-    soup = BeautifulSoup(html_doc.text, 'html.parser')
+def parse_puzzle(html: str, puzzle_url: str) -> Puzzle:
+    soup = make_soup(html, PUZZLE_STRAINER)
     title_selector = soup.find('div', class_="page-header").find('h1').text
     title = re.search("(.*)\sZebra", title_selector).group(1)
     description = soup.find('div', class_="page-header").find('div', class_='description').text
@@ -47,34 +50,114 @@ def extract_puzzle(puzzle_url: str) -> Puzzle:
     )
 
 
-def extract_all_puzzles() -> List[Puzzle]:
-    """Returns a list of all the puzzles found on the Brainzilla source"""
-    pages_urls = extract_pages()
-    print(pages_urls)
-
-    # Extract all puzzles
-    puzzles = []
-    for path in pages_urls:
-        full_path = f"{DOMAIN}{path}"
-        extracted_puzzle = extract_puzzle(full_path)
-        puzzles.append(extracted_puzzle)
-        # print(extracted_puzzle.title, extracted_puzzle.url, extracted_puzzle.description, extracted_puzzle.clues)
-        print(extracted_puzzle.title)
+def extract_pages(crawler: Optional[Crawler] = None, domain: str = DOMAIN) -> List[str]:
+    start_url = f"{domain}{ZEBRA_PUZZLES_PATH}"
+    html_doc = crawler.fetch(start_url) if crawler else requests.get(start_url)
+    return parse_pages(html_doc.text)
+
+
+def extract_puzzle(puzzle_url: str, crawler: Optional[Crawler] = None) -> Puzzle:
+    html_doc = crawler.fetch(puzzle_url) if crawler else requests.get(puzzle_url)
+    return parse_puzzle(html_doc.text, puzzle_url)
+
+
+def extract_all_puzzles(crawler: Optional[Crawler] = None, domain: str = DOMAIN) -> List[Puzzle]:
+    """
+    Returns a list of all the puzzles found on the Brainzilla source, in the order of the puzzles page.
+    The puzzle pages are fetched concurrently by the crawler (a default one if none is given).
+    """
+    own_crawler = crawler is None
+    crawler = crawler or Crawler()
+    try:
+        pages_urls = extract_pages(crawler, domain)
+        print(pages_urls)
+
+        # Extract all puzzles
+        puzzles = []
+        for extracted_puzzle in crawler.map(lambda path: extract_puzzle(f"{domain}{path}", crawler), pages_urls):
+            puzzles.append(extracted_puzzle)
+            print(extracted_puzzle.title)
+    finally:
+        if own_crawler:
+            crawler.close()
     return puzzles
 
 
-def populate_db(puzzles: List[Puzzle]):
-    # Add Source
-    brainzilla_source = Source.create(
+@register_extractor("Brainzilla")
+class BrainzillaExtractor(Extractor):
+    def list_pages(self) -> List[str]:
+        html_doc = self.crawler.fetch(self.base_url)
+        return [f"{self.source.domain}{path}" for path in parse_pages(html_doc.text)]
+
+    def parse_puzzle(self, html: str, url: str) -> Puzzle:
+        return parse_puzzle(html, url)
+
+
+def get_brainzilla_source() -> Source:
+    return get_or_create_source(
         name="Brainzilla",
-        domain="https://www.brainzilla.com",
-        puzzles_path="/logic/zebra/"
+        domain=DOMAIN,
+        puzzles_path=ZEBRA_PUZZLES_PATH
     )
-    brainzilla_source.save()
 
-    # Add puzzles
+
+def populate_db(puzzles: List[Puzzle]) -> Dict[str, int]:
+    """Adds the Brainzilla source if needed and upserts the puzzles; returns the inserted/updated/skipped counts"""
+    brainzilla_source = get_brainzilla_source()
     for puzzle in puzzles:
-        puzzle.save()
+        puzzle.source_id = brainzilla_source.id
+
+    counts = upsert_puzzles(puzzles)
+    print(counts)
+    return counts
+
+
+def replay_all_puzzles(index_file: str, domain: str = DOMAIN, workers: int = os.cpu_count() or 1) -> List[Puzzle]:
+    """Same result as `extract_all_puzzles`, from the pages archived by a crawl instead of the network"""
+    reader = ArchiveReader(index_file)
+    try:
+        pages_urls = [f"{domain}{path}" for path in parse_pages(reader.read(f"{domain}{ZEBRA_PUZZLES_PATH}"))]
+    finally:
+        reader.close()
+    return replay(index_file, parse_puzzle, pages_urls, workers)
+
+
+def recrawl_puzzles(crawler: Optional[Crawler] = None, domain: str = DOMAIN) -> ChangeSet:
+    """
+    Re-crawls the Brainzilla source incrementally: the puzzle pages are fetched with conditional requests, and
+    only the new and changed ones are parsed and written to the DB. Returns the change set of the crawl.
+    """
+    started_at = datetime.datetime.now()
+    source_id = get_brainzilla_source().id
+    stored_urls = set(iter_source_puzzle_urls(source_id))
+    own_crawler = crawler is None
+    crawler = crawler or Crawler()
+    try:
+        pages_urls = [f"{domain}{path}" for path in extract_pages(crawler, domain)]
+        # a page is only skipped if its puzzle is still in the DB
+        stored_validators = {url: PageValidators(*validators) for url, validators
+                             in get_page_validators(url for url in pages_urls if url in stored_urls).items()}
+        fetched = list(crawler.map(lambda url: (url, *crawler.fetch_if_changed(url, stored_validators.get(url))),
+                                   pages_urls))
+    finally:
+        if own_crawler:
+            crawler.close()
+
+    populate_db([parse_puzzle(html, url) for url, html, _ in fetched if html is not None])
+    save_page_validators({url: validators for url, _, validators in fetched
+                          if validators != stored_validators.get(url)})
+
+    updated_urls = set(iter_updated_puzzle_urls(started_at, source_id))
+    change_set = ChangeSet(
+        started_at=started_at,
+        new=[url for url in pages_urls if url in updated_urls and url not in stored_urls],
+        changed=[url for url in pages_urls if url in updated_urls and url in stored_urls],
+        removed=sorted(stored_urls.difference(pages_urls)),
+        unchanged=len(pages_urls) - len(updated_urls),
+    )
+    print(f"{len(change_set.new)} new, {len(change_set.changed)} changed, {len(change_set.removed)} removed, "
+          f"{change_set.unchanged} unchanged puzzles")
+    return change_set
 
 
 def main():
@@ -96,7 +179,7 @@ def main():
     # processed_puzzle = nlp(puzzle_text)
     # displacy.render(processed_puzzle, jupyter=True, style='ent')
     puzzle_clues = get_puzzle(20)
-    processed_puzzle = nlp(puzzle_clues)
+    processed_puzzle = get_model("en_core_web_sm")(puzzle_clues)
     print(puzzle_clues)
     # print("#################################################")
     # print(displacy.render(processed_puzzle, jupyter=False, style='ent'))
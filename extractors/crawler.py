@@ -0,0 +1,141 @@
+import datetime
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from extractors.archive import PageArchive
+
+T = TypeVar("T")
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PageValidators(NamedTuple):
+    """The HTTP validators and the content hash of a fetched page, sent back by the next conditional request"""
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+
+
+class ChangeSet(NamedTuple):
+    """
+    Urls of the puzzles found new, changed and removed by a re-crawl. The new and changed puzzles are the ones
+    of `repository.puzzle_repository.iter_puzzles(updated_since=change_set.started_at)`.
+    """
+    started_at: datetime.datetime
+    new: List[str]
+    changed: List[str]
+    removed: List[str]
+    unchanged: int
+
+
+class RateLimiter:
+    """Spaces the requests to each host by at least 1 / `requests_per_second` seconds, across all the threads"""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slots: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slots.get(host, now))
+            self._next_slots[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Crawler:
+    """
+    Fetches pages from a pool of threads sharing one `requests.Session`, so the connections to a host are kept
+    alive and reused. At most `max_workers` requests run at once, the requests to a host are rate limited, and
+    failed requests (connection errors, timeouts, 429 and 5xx responses) are retried with exponential backoff.
+    With an archive, the fetched pages are saved to it.
+    """
+
+    def __init__(self,
+                 max_workers: int = 8,
+                 requests_per_second: float = 5.0,
+                 retries: int = 3,
+                 backoff: float = 0.5,
+                 timeout: float = 10.0,
+                 archive: Optional[PageArchive] = None):
+        self.max_workers = max_workers
+        self.archive = archive
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.session = requests.Session()
+        # One pooled connection per worker thread, for every host
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """GETs a page, retrying the transient failures; raises `requests.RequestException` after the last retry"""
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.wait(url)
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    if self.archive is not None and response.status_code == 200:
+                        self.archive.add(url, response.content, response.encoding, response.headers)
+                    return response
+                if attempt == self.retries:
+                    response.raise_for_status()
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            time.sleep(delay)
+
+    def fetch_if_changed(self, url: str,
+                         validators: Optional[PageValidators] = None) -> Tuple[Optional[str], PageValidators]:
+        """
+        Sends a GET conditioned by the validators of the previous fetch of the page. Returns None and the
+        validators when the page did not change (a 304 answer, or the same content hash for the servers ignoring
+        the conditional headers), else the page text and its new validators.
+        """
+        headers = {}
+        if validators and validators.etag:
+            headers["If-None-Match"] = validators.etag
+        if validators and validators.last_modified:
+            headers["If-Modified-Since"] = validators.last_modified
+        response = self.fetch(url, headers)
+        if response.status_code == 304 and validators:
+            return None, validators
+        new_validators = PageValidators(etag=response.headers.get("ETag"),
+                                        last_modified=response.headers.get("Last-Modified"),
+                                        content_hash=hashlib.sha256(response.content).hexdigest())
+        if validators and validators.content_hash == new_validators.content_hash:
+            return None, new_validators
+        return response.text, new_validators
+
+    def map(self, function: Callable[[str], T], urls: Iterable[str]) -> Iterator[T]:
+        """Runs `function` (which fetches with this crawler) over the urls concurrently; yields the results in order"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            yield from executor.map(function, urls)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self) -> "Crawler":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
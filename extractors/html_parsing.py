@@ -0,0 +1,32 @@
+"""
+Parsing of the puzzle pages. Only the elements read by the extractors are parsed (with a `SoupStrainer`), by
+lxml when it is installed, else by the standard library parser.
+"""
+from functools import lru_cache
+from typing import Optional
+
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+
+# The parsers in order of preference, the fastest first
+PARSERS = ("lxml", "html.parser")
+
+# The elements read by `extract_pages` and `extract_puzzle`: `div.description` is inside `div.page-header`
+PAGES_STRAINER = SoupStrainer("div", class_="col-lg-8")
+PUZZLE_STRAINER = SoupStrainer("div", class_=["page-header", "clues"])
+
+
+@lru_cache()
+def get_parser() -> str:
+    """Returns the first of `PARSERS` available in this environment"""
+    for parser in PARSERS:
+        try:
+            BeautifulSoup("", parser)
+            return parser
+        except FeatureNotFound:
+            continue
+    return "html.parser"
+
+
+def make_soup(html: str, parse_only: Optional[SoupStrainer] = None, parser: Optional[str] = None) -> BeautifulSoup:
+    """Parses a page, or only the elements of the page matched by `parse_only`"""
+    return BeautifulSoup(html, parser or get_parser(), parse_only=parse_only)
@@ -0,0 +1,93 @@
+"""
+Crawls several sources in parallel: each source is crawled by its registered extractor with its own crawler,
+so its own concurrency budget, and the parsed puzzles of all the sources are streamed into `upsert_puzzles`.
+"""
+import argparse
+import queue
+import threading
+from typing import Dict, Iterable, Iterator, Optional
+
+from extractors.base import get_extractor_class, load_extractors
+from extractors.crawler import Crawler
+from repository.database import create_database
+from repository.models import Puzzle, Source
+from repository.puzzle_repository import upsert_puzzles
+
+# Marks the end of the puzzles of one source in the queue
+_DONE = object()
+
+
+def _crawl_source(source: Source, max_workers: Optional[int], requests_per_second: Optional[float],
+                  puzzles: queue.Queue, errors: Dict[int, Exception]):
+    try:
+        extractor_class = get_extractor_class(source)
+        crawler = Crawler(max_workers or extractor_class.max_workers,
+                          extractor_class.requests_per_second if requests_per_second is None else requests_per_second)
+        with crawler:
+            extractor = extractor_class(source, crawler)
+            for puzzle in crawler.map(extractor.extract_puzzle, extractor.list_pages()):
+                puzzles.put(puzzle)
+    except Exception as e:
+        errors[source.id] = e
+    finally:
+        puzzles.put(_DONE)
+
+
+def _until_all_done(puzzles: queue.Queue, sources_count: int, counts: Dict[int, int]) -> Iterator[Puzzle]:
+    done_count = 0
+    while done_count < sources_count:
+        puzzle = puzzles.get()
+        if puzzle is _DONE:
+            done_count += 1
+            continue
+        counts[puzzle.source_id] = counts.get(puzzle.source_id, 0) + 1
+        yield puzzle
+
+
+def crawl_sources(sources: Iterable[Source],
+                  max_workers: Optional[Dict[str, int]] = None,
+                  requests_per_second: Optional[Dict[str, float]] = None,
+                  chunk_size: int = 100,
+                  max_queue_size: int = 1000) -> Dict:
+    """
+    Crawls the given sources in parallel and upserts their puzzles as they are parsed, in chunks of `chunk_size`.
+    The concurrency budget of a source is the one of its extractor, unless overridden by source name in
+    `max_workers` and `requests_per_second`. Returns the inserted/updated/skipped counts, and the puzzles count of
+    each source ID under "sources"; raises the error of a failed source once the other sources are done.
+    """
+    load_extractors()
+    sources = list(sources)
+    max_workers = max_workers or {}
+    requests_per_second = requests_per_second or {}
+    # Bounded, so slow DB writes slow the crawlers down instead of piling up the parsed puzzles
+    puzzles = queue.Queue(maxsize=max_queue_size)
+    errors: Dict[int, Exception] = {}
+    threads = [threading.Thread(target=_crawl_source,
+                                args=(source, max_workers.get(source.name), requests_per_second.get(source.name),
+                                      puzzles, errors),
+                                daemon=True)
+               for source in sources]
+    for thread in threads:
+        thread.start()
+
+    puzzles_counts: Dict[int, int] = {}
+    counts = upsert_puzzles(_until_all_done(puzzles, len(sources), puzzles_counts), chunk_size)
+    for thread in threads:
+        thread.join()
+    if errors:
+        source_id, error = next(iter(errors.items()))
+        raise Exception(f"The crawl of the source {source_id} failed") from error
+    return {**counts, "sources": {source.id: puzzles_counts.get(source.id, 0) for source in sources}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl all the sources of the DB and upsert their puzzles")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    args = parser.parse_args()
+
+    create_database()
+    print(crawl_sources(Source.select(), chunk_size=args.chunk_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+import json
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+from utils import load_data
+
+# The gazetteers of the entity_ruler, in the order their patterns are added. When the same phrase appears in
+# several files, the last one wins (e.g. Orange is a COLOR, not a FRUIT, and Sydney a GPE, not a PERSON): see
+# `load_gazetteers`, which both the entity_ruler and `GazetteerMatcher` are built from.
+ENTITY_RULES = [
+    ("entity_rules/persons.json", "PERSON"),
+    ("entity_rules/fruits.json", "FRUIT"),
+    ("entity_rules/products.json", "PRODUCT"),
+    ("entity_rules/animals.json", "ANIMAL"),
+    ("entity_rules/colors.json", "COLOR"),
+    ("entity_rules/professions.json", "PROFESSION"),
+    ("entity_rules/gpes.json", "GPE"),
+    ("entity_rules/orgs.json", "ORG"),
+    ("entity_rules/nationalities.json", "NORP"),
+    ("entity_rules/hobbies.json", "HOBBY"),
+    ("entity_rules/categories.json", "CATEGORY"),
+    ("entity_rules/locations.json", "LOC"),
+    ("entity_rules/dates.json", "DATE"),
+    ("entity_rules/times.json", "TIME"),
+    ("entity_rules/cardinals.json", "CARDINAL"),
+    ("entity_rules/quantities.json", "QUANTITY"),
+    ("entity_rules/work_of_art.json", "WORK_OF_ART"),
+]
+
+# Key of the label in a trie node; tokens are never empty, so it cannot collide with a child
+_LABEL = ""
+# Keys of the characters trie: the end of a phrase, and the separator of two tokens (tokens have no whitespace)
+_END = ""
+_SEPARATOR = " "
+
+# Approximation of the spaCy English tokenizer rules that matter for the gazetteers
+_SPECIAL_CASES = {"Mr.", "Mrs.", "Ms.", "Dr.", "St.", "Jr.", "Sr.", "a.m.", "p.m.", "e.g.", "i.e.", "etc."}
+_PREFIX = re.compile(r"""^[("'\[{$£€<#&*~“‘«]""")
+_SUFFIX = re.compile(r"""(?:'s|'S|’s|’S|n't|'re|'ll|'ve|'d|'m|\.\.\.|…|[.,;:!?)"'\]}>”’»%—–]|(?<=[0-9])\+)$""")
+_INFIX = re.compile(r"(?<=[A-Za-z0-9])[-–—](?=[A-Za-z])"
+                    r"|(?<=[0-9])[-+*^](?=[0-9-])"
+                    r"|(?<=[a-z])\.(?=[A-Z])"
+                    r"|(?<=[A-Za-z]),(?=[A-Za-z])"
+                    r"|(?<=[A-Za-z0-9])[:<>=/](?=[A-Za-z])")
+_WHITESPACE = re.compile(r"\S+")
+# Words that no prefix, suffix, infix or special case splits
+_PLAIN_WORD = re.compile(r"[A-Za-z0-9]+")
+
+Token = Tuple[str, int, int]
+Span = Tuple[int, int, str]
+
+
+def _split_infixes(text: str, offset: int) -> List[Token]:
+    tokens = []
+    position = 0
+    for match in _INFIX.finditer(text):
+        if match.start() > position:
+            tokens.append((text[position:match.start()], offset + position, offset + match.start()))
+        tokens.append((match.group(), offset + match.start(), offset + match.end()))
+        position = match.end()
+    if position < len(text):
+        tokens.append((text[position:], offset + position, offset + len(text)))
+    return tokens
+
+
+def tokenize(text: str) -> List[Token]:
+    """Splits a text into (token, start_char, end_char) tuples, following the spaCy English tokenizer rules"""
+    tokens = []
+    for chunk in _WHITESPACE.finditer(text):
+        start, end = chunk.start(), chunk.end()
+        if _PLAIN_WORD.fullmatch(text, start, end):
+            tokens.append((chunk.group(), start, end))
+            continue
+        suffixes = []
+        while start < end:
+            substring = text[start:end]
+            if substring in _SPECIAL_CASES:
+                break
+            prefix = _PREFIX.match(substring)
+            if prefix:
+                tokens.append((prefix.group(), start, start + prefix.end()))
+                start += prefix.end()
+                continue
+            suffix = _SUFFIX.search(substring)
+            if suffix and suffix.start() > 0:
+                suffixes.append((suffix.group(), start + suffix.start(), end))
+                end = start + suffix.start()
+                continue
+            break
+        if start < end:
+            tokens.extend(_split_infixes(text[start:end], start))
+        tokens.extend(reversed(suffixes))
+    return tokens
+
+
+@lru_cache(maxsize=100_000)
+def _word_tokens(word: str) -> Tuple[Token, ...]:
+    """The tokens of a whitespace-separated word, with offsets relative to it; clue sets repeat most words"""
+    return tuple(tokenize(word))
+
+
+def load_gazetteers(entity_rules: Iterable[Tuple[str, str]] = ENTITY_RULES) -> List[Tuple[str, List[str]]]:
+    """The (label, phrases) of each gazetteer, without the phrases that a later gazetteer lists too"""
+    gazetteers = [(label, load_data(file)) for file, label in entity_rules]
+    winners = {phrase: index for index, (_, phrases) in enumerate(gazetteers) for phrase in phrases}
+    return [(label, [phrase for phrase in phrases if winners[phrase] == index])
+            for index, (label, phrases) in enumerate(gazetteers)]
+
+
+def _trie_pattern(node: Dict) -> str:
+    """A regex matching the start of a text when it starts with one of the phrases of a characters trie"""
+    if _END in node:
+        return ""
+    alternatives = [(r"\s*" if atom == _SEPARATOR else re.escape(atom)) + _trie_pattern(child)
+                    for atom, child in sorted(node.items())]
+    return alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+
+
+class GazetteerMatcher:
+    """
+    Standalone equivalent of the `models/puzzle_ner` entity_ruler, with one label per phrase (a phrase added
+    again takes the new label, as in `load_gazetteers`). Like the EntityRuler, the longest matches in tokens
+    win, then the ones starting first.
+
+    The phrases are compiled into a trie over tokens, and into a regex of the same trie over characters. The
+    regex finds the few positions where a phrase may start in one C-level scan, and only the words from those
+    positions are tokenized and matched against the tokens trie, instead of the whole text.
+    """
+    __slots__ = ("_trie", "_chars_trie", "_starts", "patterns_count")
+
+    def __init__(self):
+        self._trie = {}
+        self._chars_trie = {}
+        self._starts = None
+        self.patterns_count = 0
+
+    @classmethod
+    def from_entity_rules(cls, entity_rules: Iterable[Tuple[str, str]] = ENTITY_RULES) -> "GazetteerMatcher":
+        matcher = cls()
+        for label, phrases in load_gazetteers(entity_rules):
+            matcher.add(label, phrases)
+        return matcher
+
+    @classmethod
+    def from_patterns_file(cls, patterns_file: str = "models/puzzle_ner/entity_ruler/patterns.jsonl"):
+        """Loads the phrase patterns saved with an entity_ruler component"""
+        matcher = cls()
+        with open(patterns_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    pattern = json.loads(line)
+                    if isinstance(pattern["pattern"], str):
+                        matcher.add(pattern["label"], [pattern["pattern"]])
+        return matcher
+
+    def add(self, label: str, phrases: Iterable[str]):
+        for phrase in phrases:
+            tokens = [token for token, _, _ in tokenize(phrase)]
+            if not tokens:
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[_LABEL] = label
+
+            node = self._chars_trie
+            for atom in _SEPARATOR.join(tokens):
+                node = node.setdefault(atom, {})
+            node[_END] = True
+            self.patterns_count += 1
+        self._starts = None
+
+    def _compile(self):
+        # Tokens starting with a letter or a digit never follow one; the other candidates are checked on the tokens.
+        # The class of the first characters only saves the regex from entering the trie at most positions.
+        first_chars = "".join(re.escape(char) for char in sorted(self._chars_trie) if char != _END)
+        self._starts = re.compile(
+            r"(?<![A-Za-z0-9])(?=[" + first_chars + "])(?=" + _trie_pattern(self._chars_trie) + ")")
+
+    def _candidates(self, text: str) -> List[Tuple[int, int, int, str]]:
+        """The (tokens_count, start_char, end_char, label) of all the matches, overlapping or not"""
+        if self._starts is None:
+            self._compile()
+        trie = self._trie
+        candidates = []
+        for start_match in self._starts.finditer(text):
+            start = start_match.start()
+            word_start = start
+            while word_start and not text[word_start - 1].isspace():
+                word_start -= 1
+            word_end = _WHITESPACE.match(text, word_start).end()
+            tokens = _word_tokens(text[word_start:word_end])
+            first = 0
+            while first < len(tokens) and tokens[first][1] < start - word_start:
+                first += 1
+            if first == len(tokens) or tokens[first][1] != start - word_start:
+                continue
+            node = trie
+            index = first
+            tokens_count = 0
+            while True:
+                if index == len(tokens):
+                    # The phrase may go on in the next word
+                    word = _WHITESPACE.search(text, word_end)
+                    if word is None:
+                        break
+                    word_start, word_end = word.span()
+                    tokens = _word_tokens(word.group())
+                    index = 0
+                node = node.get(tokens[index][0])
+                if node is None:
+                    break
+                tokens_count += 1
+                label = node.get(_LABEL)
+                if label is not None:
+                    candidates.append((tokens_count, start, word_start + tokens[index][2], label))
+                index += 1
+        return candidates
+
+    def __call__(self, text: str) -> List[Span]:
+        """Returns the (start_char, end_char, label) of the entities found in a text, in text order"""
+        spans = []
+        covered = bytearray(len(text))
+        for _, start, end, label in sorted(self._candidates(text), key=lambda match: (-match[0], match[1])):
+            if covered.find(1, start, end) == -1:
+                covered[start:end] = b"\x01" * (end - start)
+                spans.append((start, end, label))
+        spans.sort()
+        return spans
+
+    def extract_entities(self, text: str) -> Dict:
+        """Same nested {label: {text: [(start, end)]}} structure as `output_generator.extract_entities_from_clues`"""
+        result = defaultdict(lambda: defaultdict(list))
+        for start, end, label in self(text):
+            result[label][text[start:end]].append((start, end))
+        return result
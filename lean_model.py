@@ -0,0 +1,34 @@
+import argparse
+
+import spacy
+from spacy.language import Language
+
+from model_registry import ner_only_exclude
+
+MODEL = "models/ner_brainzilla_puzzles_model_50_lg_final"
+NER_ONLY_MODEL = "models/ner_brainzilla_puzzles_model_50_lg_final_ner_only"
+
+
+def export_ner_model(model: str, output_dir: str) -> Language:
+    """
+    Writes a slimmed copy of a saved model, holding only the components that produce `doc.ents`
+    (entity_ruler and ner, plus tok2vec when ner listens to it).
+    """
+    excluded_components = ner_only_exclude(model)
+    nlp = spacy.load(model, exclude=list(excluded_components))
+    nlp.meta["description"] = f"NER-only profile of {model} (excluded: {', '.join(excluded_components)})"
+    nlp.to_disk(output_dir)
+    print(f"Exported {nlp.pipe_names} to {output_dir}")
+    return nlp
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the NER-only profile of a trained model")
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--output", default=NER_ONLY_MODEL)
+    args = parser.parse_args()
+    export_ner_model(args.model, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple
+
+import spacy
+from spacy.language import Language
+from spacy.util import load_config
+
+# The components `doc.ents` depends on; the NER-only profile excludes all the others
+NER_COMPONENTS = ("tok2vec", "entity_ruler", "ner")
+# Used for the installed packages, whose config is not read
+DEFAULT_NER_ONLY_EXCLUDE = ("tagger", "parser", "senter", "attribute_ruler", "lemmatizer", "morphologizer")
+
+# Loaded models, keyed by (model path or package name, disabled components, excluded components)
+_models: Dict[Tuple[str, Tuple[str, ...], Tuple[str, ...]], Language] = {}
+_lock = threading.Lock()
+
+
+def _model_key(model: str, disable: Iterable[str], exclude: Iterable[str]) -> Tuple:
+    name = os.path.normpath(model) if os.path.exists(model) else model
+    return name, tuple(sorted(set(disable))), tuple(sorted(set(exclude)))
+
+
+def get_model(model: str, disable: Iterable[str] = (), exclude: Iterable[str] = ()) -> Language:
+    """
+    Returns the spaCy model found at the given path (or installed under the given package name).
+    The model is loaded on its first use and the same instance is handed to every caller of the process.
+    """
+    key = _model_key(model, disable, exclude)
+    nlp = _models.get(key)
+    if nlp is None:
+        with _lock:
+            nlp = _models.get(key)
+            if nlp is None:
+                name, disabled_components, excluded_components = key
+                nlp = spacy.load(name, disable=list(disabled_components), exclude=list(excluded_components))
+                _models[key] = nlp
+    return nlp
+
+
+@lru_cache()
+def ner_only_exclude(model: str) -> Tuple[str, ...]:
+    """
+    Returns the components of a saved model that `doc.ents` does not depend on.
+    `tok2vec` is only kept when the `ner` component listens to it; otherwise `ner` embeds the tokens itself.
+    """
+    config_path = os.path.join(model, "config.cfg")
+    if not os.path.isfile(config_path):
+        return DEFAULT_NER_ONLY_EXCLUDE
+    config = load_config(config_path, interpolate=False)
+    ner_tok2vec = config["components"].get("ner", {}).get("model", {}).get("tok2vec", {})
+    needed_components = set(NER_COMPONENTS)
+    if "Listener" not in ner_tok2vec.get("@architectures", ""):
+        needed_components.discard("tok2vec")
+    return tuple(pipe for pipe in config["nlp"]["pipeline"] if pipe not in needed_components)
+
+
+def get_ner_model(model: str) -> Language:
+    """Returns the model loaded with the NER-only profile: only the components that produce `doc.ents`"""
+    return get_model(model, exclude=ner_only_exclude(model))
+
+
+def warm_up(model: str, disable: Iterable[str] = (), exclude: Iterable[str] = ()) -> threading.Thread:
+    """Loads a model in a background thread, so a long-running worker pays the load cost off the request path.
+    Join the returned thread to wait for the load to finish."""
+    thread = threading.Thread(target=get_model, args=(model, tuple(disable), tuple(exclude)), daemon=True)
+    thread.start()
+    return thread
+
+
+def is_loaded(model: str, disable: Iterable[str] = (), exclude: Iterable[str] = ()) -> bool:
+    """Returns True if the model was already loaded in this process"""
+    return _model_key(model, disable, exclude) in _models
+
+
+def clear():
+    """Forgets all the loaded models (e.g. after retraining one of them)"""
+    with _lock:
+        _models.clear()
@@ -0,0 +1,246 @@
+"""
+Long-running NER service: loads the model once and serves the entities of puzzle clues over HTTP.
+
+    POST /entities  {"clues": "..."}                 -> {label: {text: [[start, end]]}}
+    POST /output    {"title": "...", "clues": "..."} -> {"rows": [[...]]} (and writes the mace4 file)
+    GET  /stats                                      -> latency percentiles, batching and cache counters
+
+Concurrent requests are gathered into micro-batches for `nlp.pipe`. The pending requests are held in a bounded
+queue, and the service answers 503 when it is full.
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from entity_cache import get_cache
+from model_registry import get_ner_model, ner_only_exclude, warm_up
+from output_generator import MODEL, entities_from_doc, generate_output_from_entities
+
+
+class MicroBatcher:
+    """
+    Gathers the submitted clue texts into batches of at most `max_batch_size` texts, waiting at most
+    `max_wait` seconds after the first text of a batch, and runs each batch through `nlp.pipe`. If the model
+    cannot be loaded, the pending and the later texts fail with the load error instead of timing out.
+    """
+
+    def __init__(self, model: str, max_batch_size: int = 32, max_wait: float = 0.01, max_queue_size: int = 256):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches_count = 0
+        self.texts_count = 0
+        self._load_error: Optional[Exception] = None
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, clue_text: str) -> Future:
+        """Queues a clue text for NER. Raises `queue.Full` when the service is overloaded."""
+        if self._load_error is not None:
+            raise self._load_error
+        future = Future()
+        self._queue.put_nowait((clue_text, future))
+        return future
+
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    def _next_batch(self) -> List:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            nlp = get_ner_model(self.model)
+        except Exception as e:
+            self._load_error = RuntimeError(f"Could not load the NER model {self.model}: {e}")
+            # Texts may have been queued before the error was set
+            while True:
+                for _, future in self._next_batch():
+                    future.set_exception(self._load_error)
+        while True:
+            batch = self._next_batch()
+            texts = [clue_text for clue_text, _ in batch]
+            try:
+                docs = list(nlp.pipe(texts, batch_size=len(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches_count += 1
+            self.texts_count += len(texts)
+            for (_, future), doc in zip(batch, docs):
+                future.set_result(entities_from_doc(doc))
+
+
+class LatencyRecorder:
+    """Keeps the latencies of the last requests and reports their percentiles"""
+
+    def __init__(self, max_samples: int = 10_000):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def summary(self) -> Dict:
+        p50, p99 = self.percentile(50), self.percentile(99)
+        return {
+            "requests": len(self._samples),
+            "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 2) if p99 is not None else None,
+        }
+
+
+class NerService:
+    def __init__(self, model: str = MODEL, max_batch_size: int = 32, max_wait: float = 0.01,
+                 max_queue_size: int = 256, request_timeout: float = 30.0, use_cache: bool = True):
+        self.model = model
+        self.request_timeout = request_timeout
+        self.cache = get_cache(model) if use_cache else None
+        self.batcher = MicroBatcher(model, max_batch_size, max_wait, max_queue_size)
+        self.latencies = LatencyRecorder()
+
+    def extract_entities(self, clue_text: str) -> dict:
+        """Same result as `output_generator.extract_entities_from_clues`, batched with the concurrent requests"""
+        if self.cache:
+            entities = self.cache.get(clue_text)
+            if entities is not None:
+                return entities
+        entities = self.batcher.submit(clue_text).result(timeout=self.request_timeout)
+        if self.cache:
+            self.cache.put(clue_text, entities)
+        return entities
+
+    def generate_output(self, clue_title: str, clue_text: str) -> List[List]:
+        """Same result as `output_generator.generate_output_file`"""
+        return generate_output_from_entities(clue_title, self.extract_entities(clue_text))
+
+    def stats(self) -> Dict:
+        stats = {
+            "latency": self.latencies.summary(),
+            "queue_size": self.batcher.queue_size(),
+            "batches": self.batcher.batches_count,
+            "batched_texts": self.batcher.texts_count,
+        }
+        if self.cache:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+def _text_field(request, name: str) -> str:
+    """The string field of a JSON request; raises TypeError for the other JSON values, which would fail the batch"""
+    value = request[name]
+    if not isinstance(value, str):
+        raise TypeError(f"{name} must be a string")
+    return value
+
+
+def _make_handler(service: NerService):
+    class NerRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, data):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send_json(200, service.stats())
+            else:
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            start_time = time.perf_counter()
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/entities":
+                    response = service.extract_entities(_text_field(request, "clues"))
+                elif self.path == "/output":
+                    response = {"rows": service.generate_output(_text_field(request, "title"),
+                                                                _text_field(request, "clues"))}
+                else:
+                    self._send_json(404, {"error": f"Unknown path {self.path}"})
+                    return
+            except queue.Full:
+                self._send_json(503, {"error": "Too many pending requests, retry later"})
+            except FutureTimeoutError:
+                self._send_json(504, {"error": "The request timed out while waiting for its batch"})
+            except (KeyError, TypeError, ValueError) as e:
+                self._send_json(400, {"error": f"Invalid request: {e}"})
+            except Exception as e:
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            else:
+                self._send_json(200, response)
+            finally:
+                service.latencies.record(time.perf_counter() - start_time)
+
+        def log_message(self, format, *args):
+            pass
+
+    return NerRequestHandler
+
+
+def serve(host: str = "localhost", port: int = 5002, **service_options):
+    # Start loading the model while the server binds, so the first request does not pay for it
+    model = service_options.get("model", MODEL)
+    warm_up(model, exclude=ner_only_exclude(model))
+    service = NerService(**service_options)
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    print(f"Serving NER on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Stopping NER service: {service.stats()}")
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the puzzle NER model over HTTP")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--max-queue-size", type=int, default=256)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+    serve(args.host, args.port,
+          model=args.model,
+          max_batch_size=args.max_batch_size,
+          max_wait=args.max_wait_ms / 1000,
+          max_queue_size=args.max_queue_size,
+          use_cache=not args.no_cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,27 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
 from collections import defaultdict
+from itertools import islice
 from pprint import pprint
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 
-import spacy
+from spacy.tokens import Doc
 
+from entity_cache import get_cache, get_line_memo, model_fingerprint
+from entity_result import EXCLUDED_LABELS, EXCLUDED_TEXTS, EntityResult, StringTable
+from model_registry import get_ner_model
+from repository.entity_repository import get_or_create_model_run, save_entity_mentions
 from repository.puzzle_repository import get_puzzles_in_interval, get_puzzle_with_title, get_testing_puzzles, \
-    get_testing_puzzles_with_title
+    get_testing_puzzles_with_title, iter_puzzles
 
-nlp = spacy.load("models/ner_brainzilla_puzzles_model_50_lg_final")
+MODEL = "models/ner_brainzilla_puzzles_model_50_lg_final"
 
 
-def extract_entities_from_clues(clue_text: str) -> dict:
+def extract_entities_from_clues(clue_text: str, use_cache: bool = True, by_line: bool = False,
+                                cascade: bool = False) -> dict:
     """
     Generates a nested dict from a given clue text:
     {
@@ -24,35 +35,209 @@ def extract_entities_from_clues(clue_text: str) -> dict:
             },
         ...
     }
+    The result is looked up in the entity cache first, so unchanged clues are not processed again.
+    With `by_line`, each clue line is processed on its own and only the lines not seen before go through the NER.
+    With `cascade`, the statistical NER only runs on the lines the entity_ruler does not fully cover.
     """
-    doc = nlp(clue_text)
+    if cascade:
+        return extract_entities_cascade(clue_text)
+    if by_line:
+        return extract_entities_by_line(clue_text)
+
+    cache = get_cache(MODEL) if use_cache else None
+    if cache:
+        entities = cache.get(clue_text)
+        if entities is not None:
+            return entities
+
+    doc = get_ner_model(MODEL)(clue_text)
+    entities = entities_from_doc(doc)
+    if cache:
+        cache.put(clue_text, entities)
+    return entities
+
+
+def split_clue_lines(clue_text: str) -> List[Tuple[int, str]]:
+    """Splits a clue text into its (offset, line) pairs, without the surrounding whitespace of each line"""
+    lines = []
+    offset = 0
+    for line in clue_text.splitlines(keepends=True):
+        stripped_line = line.strip()
+        if stripped_line:
+            lines.append((offset + len(line) - len(line.lstrip()), stripped_line))
+        offset += len(line)
+    return lines
+
+
+def extract_entities_by_line(clue_text: str) -> dict:
+    """
+    Same result as `extract_entities_from_clues`, but the NER runs only on the clue lines that were not seen
+    before; the entities of the known lines come from the line memo and are shifted to their offset in the text.
+    """
+    memo = get_line_memo(MODEL)
+    lines = split_clue_lines(clue_text)
+
+    lines_spans = {}
+    new_lines = []
+    for _, line in lines:
+        if line not in lines_spans:
+            spans = memo.get(line)
+            lines_spans[line] = spans
+            if spans is None:
+                new_lines.append(line)
+    if new_lines:
+        for line, doc in zip(new_lines, get_ner_model(MODEL).pipe(new_lines)):
+            spans = [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+            memo.put(line, spans)
+            lines_spans[line] = spans
+
+    result = defaultdict(lambda: defaultdict(list))
+    for offset, line in lines:
+        for start, end, label in lines_spans[line]:
+            result[label][line[start:end]].append((offset + start, offset + end))
+    return result
+
+
+def _needs_statistical_ner(doc: Doc) -> bool:
+    """
+    Returns True if a clue line processed only by the entity_ruler has capitalized words or numerals that are
+    not covered by its entities; the enumerator of a numbered clue (e.g. `1.`) does not count.
+    """
+    for token in doc:
+        if token.ent_iob_ in ("B", "I"):
+            continue
+        if token.like_num and token.i > 0:
+            return True
+        if token.is_alpha and (token.is_title or token.is_upper) and not token.is_stop:
+            return True
+    return False
+
+
+def extract_entities_cascade(clue_text: str, stats: Optional[Dict[str, int]] = None) -> dict:
+    """
+    Rules-first version of `extract_entities_from_clues`: every clue line goes through the entity_ruler, and
+    only the lines with uncovered capitalized words or numerals go through the full pipeline, where the ruler
+    entities keep their precedence over the statistical ones. The given `stats` dict counts the lines.
+    """
+    nlp = get_ner_model(MODEL)
+    ruler = nlp.get_pipe("entity_ruler")
+    lines = split_clue_lines(clue_text)
+
+    lines_spans = []
+    escalated_lines = []
+    for offset, line in lines:
+        doc = ruler(nlp.make_doc(line))
+        if _needs_statistical_ner(doc):
+            lines_spans.append(None)
+            escalated_lines.append(len(lines_spans) - 1)
+        else:
+            lines_spans.append([(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents])
+    docs = nlp.pipe(lines[index][1] for index in escalated_lines)
+    for index, doc in zip(escalated_lines, docs):
+        lines_spans[index] = [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+
+    if stats is not None:
+        stats["lines"] = stats.get("lines", 0) + len(lines)
+        stats["escalated_lines"] = stats.get("escalated_lines", 0) + len(escalated_lines)
 
     result = defaultdict(lambda: defaultdict(list))
+    for (offset, line), spans in zip(lines, lines_spans):
+        for start, end, label in spans:
+            result[label][line[start:end]].append((offset + start, offset + end))
+    return result
+
+
+def line_dedup_stats(clue_texts: Iterable[str]) -> Dict[str, float]:
+    """Counts how many clue lines repeat across the given clue texts"""
+    lines_count = 0
+    unique_lines = set()
+    for clue_text in clue_texts:
+        for _, line in split_clue_lines(clue_text):
+            lines_count += 1
+            unique_lines.add(line)
+    return {
+        "lines": lines_count,
+        "unique_lines": len(unique_lines),
+        "dedup_ratio": 1 - len(unique_lines) / lines_count if lines_count else 0.0,
+    }
+
+
+def entities_from_doc(doc: Doc) -> dict:
+    """Groups the entities of a processed doc by their label and text (see `extract_entities_from_clues`)"""
+    result = defaultdict(lambda: defaultdict(list))
 
     for ent in doc.ents:
         result[ent.label_][ent.text].append((ent.start_char, ent.end_char))
     return result
 
 
+def render_mace4(data: List[List]) -> str:
+    """Returns the content of a mace4 input file listing the given rows"""
+    return "".join(["set(arithmetic).\nassign(domain_size, 5).\nassign(max_models, -1).\nlist(distinct).\n",
+                    *[f"{row}.\n" for row in data],
+                    "end_of_list.\n"])
+
+
+def write_if_changed(output_file: str, content: str) -> bool:
+    """
+    Writes a file atomically (temporary file + rename), unless it already holds the same content.
+    Returns True if the file was written.
+    """
+    new_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    if os.path.isfile(output_file):
+        with open(output_file, 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() == new_hash:
+                return False
+
+    output_dir = os.path.dirname(output_file) or "."
+    with tempfile.NamedTemporaryFile('w', encoding="utf-8", dir=output_dir, delete=False,
+                                     prefix=".", suffix=".tmp") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, output_file)
+    return True
+
+
 def _write_to_file(data: List[List], output_file: str):
-    with open(output_file, 'w', encoding="utf-8") as f:
-        f.write("set(arithmetic).\nassign(domain_size, 5).\nassign(max_models, -1).\nlist(distinct).\n")
-        f.writelines([f"{row}.\n" for row in data])
-        f.write("end_of_list.\n")
-    print(f"Wrote to file: {output_file}\n")
+    if write_if_changed(output_file, render_mace4(data)):
+        print(f"Wrote to file: {output_file}\n")
+    else:
+        print(f"Unchanged file: {output_file}\n")
 
 
 def generate_output_file(clue_title: str, clue_text: str) -> List[List]:
     """Generates an output file for the mace4 input."""
     entities = extract_entities_from_clues(clue_text)
     pprint(dict(entities))
-    result = [list(filter(lambda x: x != "one", ent_text.keys()))  # eliminate `one` as NE
+    return generate_output_from_entities(clue_title, entities)
+
+
+def mace4_rows(entities: dict) -> List[List]:
+    """Builds the mace4 rows from the extracted entities (nested dict or `EntityResult`)"""
+    if isinstance(entities, EntityResult):
+        return entities.to_mace4_rows()
+
+    result = [list(filter(lambda x: x not in EXCLUDED_TEXTS, ent_text.keys()))  # eliminate `one` as NE
               for ent_label, ent_text in entities.items()
-              if ent_label != "ORDINAL"]  # eliminate ordinals as NE
+              if ent_label not in EXCLUDED_LABELS]  # eliminate ordinals as NE
 
     result = [x for x in result if x]  # eliminate empty lists
+    return result
+
+
+def output_file_name(clue_title: str, output_dir: str = "./mace4_files") -> str:
+    """The mace4 file of a puzzle, in `output_dir`; the title only keeps [a-z0-9_-] so it cannot leave the dir"""
+    file_name = re.sub(r"[^a-z0-9_-]", "", clue_title.lower().replace(" ", "_"))
+    if not file_name:
+        raise ValueError(f"Invalid puzzle title {clue_title!r}")
+    return f"{output_dir}/{file_name}_output"
 
 
+def generate_output_from_entities(clue_title: str, entities: dict) -> List[List]:
+    """Builds the mace4 rows from the extracted entities and writes them to the puzzle's output file."""
+    result = mace4_rows(entities)
 
     # Optional - can be deleted
     # rest = []
@@ -64,14 +249,102 @@ def generate_output_file(clue_title: str, clue_text: str) -> List[List]:
     #         result2.append(ents)
     # result2.append(rest)
 
-    file_name = f"./mace4_files/{clue_title.lower().replace(' ', '_')}_output"
     _write_to_file(
         sorted(result, key=len, reverse=True),
-        file_name)
+        output_file_name(clue_title))
 
     return result
 
 
+def extract_entities_batch(clue_texts: List[str],
+                           batch_size: int = 32,
+                           n_process: int = 1,
+                           use_cache: bool = True) -> Tuple[List[EntityResult], int]:
+    """
+    Extracts the entities of many clue texts, returned in the same order as `EntityResult`s sharing the string
+    table of the batch, plus the number of tokens that went through the NER. Cached texts skip the NER; the
+    others are fed through `nlp.pipe` ordered by their length, so the texts of a batch have similar sizes.
+    """
+    cache = get_cache(MODEL) if use_cache else None
+    strings = StringTable()
+    results = [None] * len(clue_texts)
+    uncached_indexes = []
+    for index, clue_text in enumerate(clue_texts):
+        entities = cache.get(clue_text) if cache else None
+        if entities is None:
+            uncached_indexes.append(index)
+        else:
+            results[index] = EntityResult.from_entities(entities, strings)
+
+    tokens_count = 0
+    if uncached_indexes:
+        uncached_indexes.sort(key=lambda index: len(clue_texts[index]))
+        texts = (clue_texts[index] for index in uncached_indexes)
+        docs = get_ner_model(MODEL).pipe(texts, batch_size=batch_size, n_process=n_process)
+        for index, doc in zip(uncached_indexes, docs):
+            tokens_count += len(doc)
+            entities = EntityResult.from_doc(doc, strings)
+            if cache:
+                cache.put(clue_texts[index], entities.to_dict())
+            results[index] = entities
+    return results, tokens_count
+
+
+def generate_output_files(puzzles: List[Tuple[str, str]],
+                          batch_size: int = 32,
+                          n_process: int = 1,
+                          use_cache: bool = True) -> Dict[str, List[List]]:
+    """
+    Generates the mace4 output files for many (title, clues) puzzles at once, with `extract_entities_batch`.
+    Prints the throughput in puzzles/sec and tokens/sec.
+    """
+    start_time = time.perf_counter()
+    clue_texts = [clue_text for _, clue_text in puzzles]
+    entities_list, tokens_count = extract_entities_batch(clue_texts, batch_size, n_process, use_cache)
+    results = {clue_title: generate_output_from_entities(clue_title, entities)
+               for (clue_title, _), entities in zip(puzzles, entities_list)}
+    elapsed = time.perf_counter() - start_time
+
+    if elapsed > 0:
+        print(f"Processed {len(puzzles)} puzzles ({tokens_count} tokens through NER) in {elapsed:.2f}s: "
+              f"{len(puzzles) / elapsed:.2f} puzzles/sec, {tokens_count / elapsed:.2f} tokens/sec")
+    if use_cache:
+        print(f"Entity cache: {get_cache(MODEL).stats()}")
+    return results
+
+
+def generate_output_files_in_interval(from_uid: Optional[int] = None,
+                                      to_uid: Optional[int] = None,
+                                      batch_size: int = 32,
+                                      n_process: int = 1,
+                                      use_cache: bool = True) -> Dict[str, List[List]]:
+    """Generates the mace4 output files for the puzzles in the given ID interval, or for all puzzles if no
+    interval is given."""
+    after_uid = from_uid - 1 if from_uid is not None else 0
+    puzzles = [(title, clues) for _, title, clues in iter_puzzles(after_uid, to_uid)]
+    return generate_output_files(puzzles, batch_size=batch_size, n_process=n_process, use_cache=use_cache)
+
+
+def store_entities(chunk_size: int = 500, batch_size: int = 32, use_cache: bool = True) -> int:
+    """
+    Runs the NER over all the puzzles of the DB and stores their entities as `EntityMention` rows of the current
+    model version, so they can be queried in SQL. Returns the number of stored mentions.
+    """
+    model_run = get_or_create_model_run(MODEL, model_fingerprint(MODEL))
+    puzzles = iter_puzzles()
+    mentions_count = 0
+    while True:
+        chunk = [(puzzle_id, clue_text) for puzzle_id, _, clue_text in islice(puzzles, chunk_size)]
+        if not chunk:
+            break
+        entities_list, _ = extract_entities_batch([clue_text for _, clue_text in chunk], batch_size,
+                                                  use_cache=use_cache)
+        mentions_count += save_entity_mentions(
+            model_run, [(puzzle_id, entities.rows()) for (puzzle_id, _), entities in zip(chunk, entities_list)])
+    print(f"Stored {mentions_count} entity mentions for model run {model_run.id}")
+    return mentions_count
+
+
 def main():
     # clues_list = get_puzzles_in_interval(41, 50)
     # for title, clue_text in clues_list:
@@ -88,6 +361,9 @@ def main():
     # title, clue_text = clues_list[8]
     # generate_output_file(title, clue_text)
 
+    # Bulk mode: all the puzzles from the DB, batched over several processes
+    # generate_output_files_in_interval(batch_size=16, n_process=4)
+
 
 if __name__ == '__main__':
     main()
@@ -1,20 +1,19 @@
 from typing import List, Tuple
 
-import spacy
-from spacy.training import offsets_to_biluo_tags
+from spacy.tokens import Doc
+from spacy.training import doc_to_biluo_tags, offsets_to_biluo_tags
 
 from sklearn.metrics import precision_score, recall_score, f1_score
 from sklearn.metrics import confusion_matrix
 from matplotlib import pyplot
 import numpy
-from utils import load_data
 
-# Load the custom model
-nlp = spacy.load("models/ner_brainzilla_puzzles_model_50_lg")
-# nlp = spacy.load("en_core_web_sm")
+from corpus import TESTING_DATA_FILE, load_corpus, predict_on_tokens
+from model_registry import get_model
 
-# Load the testing data
-docs = load_data("testing_data/brainzilla_testing_puzzles_15_adnotated.json")
+# The custom model, loaded on its first use
+MODEL = "models/ner_brainzilla_puzzles_model_50_lg"
+# MODEL = "en_core_web_sm"
 
 
 def get_cleaned_label(label: str):
@@ -26,14 +25,12 @@ def get_cleaned_label(label: str):
         return label
 
 
-def create_total_target_vector(processed_entities: List[str], given_label: str) -> List[str]:
+def create_total_target_vector(processed_entities: List[Doc], given_label: str) -> List[str]:
     target_vector = []
-    for clue_entities in processed_entities:
-        # print(clue_entities)
-        clue_text = nlp.make_doc(clue_entities[0])
-        # entities = clue_entities[1]["entities"]
-        entities = [x for x in clue_entities[1]["entities"] if x[2] == given_label]
-        bilou_entities = offsets_to_biluo_tags(clue_text, entities)
+    for clue_doc in processed_entities:
+        # print(clue_doc)
+        entities = [(x.start_char, x.end_char, x.label_) for x in clue_doc.ents if x.label_ == given_label]
+        bilou_entities = offsets_to_biluo_tags(clue_doc, entities)
         result = []
         for item in bilou_entities:
             result.append(get_cleaned_label(item))
@@ -41,14 +38,11 @@ def create_total_target_vector(processed_entities: List[str], given_label: str)
     return target_vector
 
 
-def create_total_target_vector_overall(processed_entities: List[str]) -> List[str]:
+def create_total_target_vector_overall(processed_entities: List[Doc]) -> List[str]:
     target_vector = []
-    for clue_entities in processed_entities:
-        # print(clue_entities)
-        clue_text = nlp.make_doc(clue_entities[0])
-        # entities = clue_entities[1]["entities"]
-        entities = [x for x in clue_entities[1]["entities"]]
-        bilou_entities = offsets_to_biluo_tags(clue_text, entities)
+    for clue_doc in processed_entities:
+        # print(clue_doc)
+        bilou_entities = doc_to_biluo_tags(clue_doc)
         result = []
         for item in bilou_entities:
             result.append(get_cleaned_label(item))
@@ -56,49 +50,50 @@ def create_total_target_vector_overall(processed_entities: List[str]) -> List[st
     return target_vector
 
 
-def create_prediction_vector(text, given_label):
-    return [get_cleaned_label(prediction) for prediction in get_all_ner_predictions(text, given_label)]
+def create_prediction_vector(clue_doc: Doc, given_label):
+    return [get_cleaned_label(prediction) for prediction in get_all_ner_predictions(clue_doc, given_label)]
 
 
-def create_prediction_vector_overall(text):
-    return [get_cleaned_label(prediction) for prediction in get_all_ner_predictions_overall(text)]
+def create_prediction_vector_overall(clue_doc: Doc):
+    return [get_cleaned_label(prediction) for prediction in get_all_ner_predictions_overall(clue_doc)]
 
 
 def create_total_prediction_vector(docs: list, given_label: str):
     prediction_vector = []
     for doc in docs:
-        prediction_vector.extend(create_prediction_vector(doc[0], given_label))
+        prediction_vector.extend(create_prediction_vector(doc, given_label))
     return prediction_vector
 
 
 def create_total_prediction_vector_overall(docs: list):
     prediction_vector = []
     for doc in docs:
-        prediction_vector.extend(create_prediction_vector_overall(doc[0]))
+        prediction_vector.extend(create_prediction_vector_overall(doc))
     return prediction_vector
 
 
-def get_all_ner_predictions(text, given_label):
-    doc = nlp(text)
+def get_all_ner_predictions(clue_doc: Doc, given_label):
+    # The model runs on the tokens of the testing Doc, so the predicted and target vectors have the same length
+    doc = predict_on_tokens(get_model(MODEL), clue_doc)
     entities = [(e.start_char, e.end_char, e.label_) for e in doc.ents if e.label_ == given_label]
     bilou_entities = offsets_to_biluo_tags(doc, entities)
     return bilou_entities
 
 
 
-def get_all_ner_predictions_overall(text):
-    doc = nlp(text)
+def get_all_ner_predictions_overall(clue_doc: Doc):
+    doc = predict_on_tokens(get_model(MODEL), clue_doc)
     entities = [(e.start_char, e.end_char, e.label_) for e in doc.ents]
     bilou_entities = offsets_to_biluo_tags(doc, entities)
     return bilou_entities
 
 
-def get_dataset_labels(given_label: str):
+def get_dataset_labels(docs: List[Doc], given_label: str):
     """Lists all the unique entities found in the testing data."""
     return sorted(set(create_total_target_vector(docs, given_label)))
 
 
-def generate_confusion_matrix(processed_entities: List[str], given_label: str):
+def generate_confusion_matrix(processed_entities: List[Doc], given_label: str):
     classes = sorted(set(create_total_target_vector(processed_entities, given_label)))
     y_true = create_total_target_vector(processed_entities, given_label)
     y_pred = create_total_prediction_vector(processed_entities, given_label)
@@ -107,7 +102,7 @@ def generate_confusion_matrix(processed_entities: List[str], given_label: str):
     return confusion_matrix(y_true, y_pred, classes)
 
 
-def generate_metrics(processed_entities: List[str], given_label: str) -> Tuple[float, float, float]:
+def generate_metrics(processed_entities: List[Doc], given_label: str) -> Tuple[float, float, float]:
     y_true = create_total_target_vector(processed_entities, given_label)
     y_pred = create_total_prediction_vector(processed_entities, given_label)
     precision = precision_score(y_true, y_pred, average='binary', pos_label=given_label)
@@ -131,7 +126,7 @@ def plot_confusion_matrix(docs, given_label: str, normalize=False, cmap=pyplot.c
     """
 
     title = 'Confusion Matrix, for SpaCy NER'
-    classes = get_dataset_labels(given_label)
+    classes = get_dataset_labels(docs, given_label)
 
     # Compute confusion matrix
     cm = generate_confusion_matrix(docs, given_label)
@@ -165,7 +160,7 @@ def plot_confusion_matrix(docs, given_label: str, normalize=False, cmap=pyplot.c
     return cm, ax, pyplot
 
 
-def generate_metrics_overall(processed_entities: List[str]) -> Tuple[float, float, float]:
+def generate_metrics_overall(processed_entities: List[Doc]) -> Tuple[float, float, float]:
     y_true = create_total_target_vector_overall(processed_entities)
     y_pred = create_total_prediction_vector_overall(processed_entities)
     precision = precision_score(y_true, y_pred, average=None)
@@ -182,6 +177,9 @@ def generate_metrics_overall(processed_entities: List[str]) -> Tuple[float, floa
 
 
 def main():
+    # The testing data, as tokenized Docs with their annotated entities
+    docs = load_corpus(TESTING_DATA_FILE)
+
     # print(docs[0][0])
     # print(sorted(set(create_total_target_vector(docs, "PERSON"))))
     # generate_confusion_matrix(docs)
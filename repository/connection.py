@@ -0,0 +1,55 @@
+import os
+import weakref
+from typing import Dict, Optional
+
+from playhouse.pool import PooledSqliteDatabase
+
+DATABASE_FILE = "puzzles.db"
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "wal",  # readers do not block the writer
+    "synchronous": "normal",  # safe with WAL, and much faster than the default `full`
+    "cache_size": -64 * 1024,  # 64 MB of page cache per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 30_000,  # ms to wait for a lock held by another connection before failing
+    "foreign_keys": 1,  # enforce the foreign keys, and their ON DELETE CASCADE
+}
+
+# The databases whose connections must be dropped in forked child processes
+_databases = weakref.WeakSet()
+
+
+def make_database(path: str = DATABASE_FILE,
+                  pragmas: Optional[Dict] = None,
+                  max_connections: int = 32,
+                  pool_timeout: float = 30) -> PooledSqliteDatabase:
+    """
+    Returns a SQLite database with tuned pragmas and a pool of connections: each thread gets its own
+    connection from the pool, and returns it on `close()`. A thread waits at most `pool_timeout` seconds for
+    a free connection. Forked processes open their own connections.
+    """
+    database = PooledSqliteDatabase(path,
+                                    pragmas={**DEFAULT_PRAGMAS, **(pragmas or {})},
+                                    max_connections=max_connections,
+                                    stale_timeout=300,
+                                    timeout=pool_timeout,
+                                    check_same_thread=False)
+    _databases.add(database)
+    return database
+
+
+def _close_inherited_connections():
+    """
+    The SQLite connections inherited from the parent process must not be used by the child: their copies are
+    returned to the pool and closed, and the child opens its own connections on demand. Only the child's file
+    descriptors are closed, so the connections of the parent are not affected.
+    """
+    for database in _databases:
+        if not database.is_closed():
+            database.close()
+        database.close_all()
+
+
+os.register_at_fork(after_in_child=_close_inherited_connections)
+
+db = make_database()
@@ -0,0 +1,43 @@
+import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from peewee import chunked
+
+from repository.models import CrawledPage
+
+MAX_QUERY_PARAMETERS = 500
+
+
+# (etag, last_modified, content_hash) of a page, e.g. an `extractors.crawler.PageValidators`
+Validators = Tuple[Optional[str], Optional[str], str]
+
+
+def get_page_validators(urls: Iterable[str]) -> Dict[str, Validators]:
+    """Returns the (etag, last_modified, content_hash) stored by the last crawl of the given urls, for the ones
+    already crawled"""
+    validators = {}
+    for batch in chunked(urls, MAX_QUERY_PARAMETERS):
+        query = (CrawledPage
+                 .select(CrawledPage.url, CrawledPage.etag, CrawledPage.last_modified, CrawledPage.content_hash)
+                 .where(CrawledPage.url.in_(batch))
+                 .tuples())
+        for url, etag, last_modified, content_hash in query:
+            validators[url] = (etag, last_modified, content_hash)
+    return validators
+
+
+def save_page_validators(pages: Dict[str, Validators]):
+    """Stores the validators of the fetched pages, replacing the ones of their previous crawl"""
+    crawled_at = datetime.datetime.now()
+    rows = ({"url": url, "etag": etag, "last_modified": last_modified,
+             "content_hash": content_hash, "crawled_at": crawled_at}
+            for url, (etag, last_modified, content_hash) in pages.items())
+    with CrawledPage._meta.database.atomic():
+        # each row binds one parameter per column
+        for batch in chunked(rows, MAX_QUERY_PARAMETERS // 5):
+            (CrawledPage
+             .insert_many(batch)
+             .on_conflict(conflict_target=[CrawledPage.url],
+                          preserve=[CrawledPage.etag, CrawledPage.last_modified, CrawledPage.content_hash,
+                                    CrawledPage.crawled_at])
+             .execute())
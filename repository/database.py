@@ -1,11 +1,60 @@
-from peewee import SqliteDatabase
+import datetime
 
-from repository.models import Puzzle, Source
+from repository.connection import db
+from repository.models import CrawledPage, EntityMention, ModelRun, Puzzle, PuzzleIndex, Source
 
+# No stemming: the index finds the puzzles mentioning an entity, and porter merges names (Daniel, Danielle)
+SEARCH_INDEX_TOKENIZER = "tokenize='unicode61'"
+
+# External-content FTS5 table over `puzzle`: it stores only the index, and the triggers keep it in sync
+SEARCH_INDEX_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS puzzle_index USING fts5("
+    f"title, description, clues, content='puzzle', content_rowid='id', {SEARCH_INDEX_TOKENIZER})",
+    "CREATE TRIGGER IF NOT EXISTS puzzle_index_after_insert AFTER INSERT ON puzzle BEGIN "
+    "INSERT INTO puzzle_index(rowid, title, description, clues) "
+    "VALUES (new.id, new.title, new.description, new.clues); END",
+    "CREATE TRIGGER IF NOT EXISTS puzzle_index_after_delete AFTER DELETE ON puzzle BEGIN "
+    "INSERT INTO puzzle_index(puzzle_index, rowid, title, description, clues) "
+    "VALUES ('delete', old.id, old.title, old.description, old.clues); END",
+    "CREATE TRIGGER IF NOT EXISTS puzzle_index_after_update AFTER UPDATE OF title, description, clues ON puzzle "
+    "BEGIN "
+    "INSERT INTO puzzle_index(puzzle_index, rowid, title, description, clues) "
+    "VALUES ('delete', old.id, old.title, old.description, old.clues); "
+    "INSERT INTO puzzle_index(rowid, title, description, clues) "
+    "VALUES (new.id, new.title, new.description, new.clues); END",
+]
+
+
+def create_search_index(database=db):
+    """Creates the FTS5 index of the puzzles and its sync triggers, and indexes the existing puzzles"""
+    with database.atomic():
+        index_exists = PuzzleIndex.table_exists()
+        if index_exists:
+            (index_sql,) = database.execute_sql("SELECT sql FROM sqlite_master WHERE name = 'puzzle_index'").fetchone()
+            if SEARCH_INDEX_TOKENIZER not in index_sql:
+                # Built with another tokenizer: rebuilt from the puzzles below
+                database.execute_sql("DROP TABLE puzzle_index")
+                index_exists = False
+        for statement in SEARCH_INDEX_SQL:
+            database.execute_sql(statement)
+        if not index_exists:
+            database.execute_sql("INSERT INTO puzzle_index(puzzle_index) VALUES ('rebuild')")
 
-def create_database():
-    db = SqliteDatabase('puzzles.db')
 
-    db.connect()
-    db.create_tables([Source, Puzzle])
+def add_missing_columns(database=db):
+    """Adds the columns introduced after the DB was created, since `create_tables` only creates missing tables"""
+    if not database.table_exists("puzzle"):
+        return
+    columns = {column.name for column in database.get_columns("puzzle")}
+    if "updated_at" not in columns:
+        with database.atomic():
+            database.execute_sql('ALTER TABLE "puzzle" ADD COLUMN "updated_at" DATETIME')
+            database.execute_sql('UPDATE "puzzle" SET "updated_at" = ?', (str(datetime.datetime.now()),))
+
+
+def create_database():
+    db.connect(reuse_if_open=True)
+    add_missing_columns()
+    db.create_tables([Source, Puzzle, ModelRun, EntityMention, CrawledPage])
+    create_search_index()
     return db
@@ -0,0 +1,86 @@
+from typing import Iterable, Iterator, List, Tuple
+
+from peewee import chunked, fn
+
+from repository.models import EntityMention, ModelRun
+
+MAX_QUERY_PARAMETERS = 500
+
+
+def get_or_create_model_run(model: str, fingerprint: str) -> ModelRun:
+    """Returns the run of the given model version, creating it on its first use"""
+    model_run, _ = ModelRun.get_or_create(model=model, fingerprint=fingerprint)
+    return model_run
+
+
+Mention = Tuple[str, str, int, int]
+
+
+def _mention_rows(model_run: ModelRun, puzzles_entities: Iterable[Tuple[int, Iterable[Mention]]]) -> Iterator[dict]:
+    for puzzle_id, mentions in puzzles_entities:
+        for label, text, start, end in mentions:
+            yield {"puzzle": puzzle_id, "model_run": model_run.id,
+                   "label": label, "text": text, "start": start, "end": end}
+
+
+def save_entity_mentions(model_run: ModelRun, puzzles_entities: List[Tuple[int, Iterable[Mention]]]) -> int:
+    """
+    Stores the (label, text, start, end) entities of the given puzzles (e.g. `EntityResult.rows()`), replacing
+    the ones previously stored for the same model run. Returns the number of stored mentions.
+    """
+    puzzle_ids = [puzzle_id for puzzle_id, _ in puzzles_entities]
+    database = EntityMention._meta.database
+    count = 0
+    with database.atomic():
+        # the model run binds one more parameter than the ids
+        for ids in chunked(puzzle_ids, MAX_QUERY_PARAMETERS - 1):
+            EntityMention.delete().where(EntityMention.model_run == model_run,
+                                         EntityMention.puzzle.in_(ids)).execute()
+        # each row binds one parameter per column: puzzle, model_run, label, text, start and end
+        for rows in chunked(_mention_rows(model_run, puzzles_entities), MAX_QUERY_PARAMETERS // 6):
+            EntityMention.insert_many(rows).execute()
+            count += len(rows)
+    return count
+
+
+def get_entity_values(label: str, model_run: ModelRun = None) -> List[Tuple[str, int]]:
+    """Returns the (text, number of puzzles) of all the values of a label, most frequent first"""
+    puzzles_count = fn.COUNT(EntityMention.puzzle.distinct())
+    query = (EntityMention
+             .select(EntityMention.text, puzzles_count)
+             .where(EntityMention.label == label)
+             .group_by(EntityMention.text)
+             .order_by(puzzles_count.desc(), EntityMention.text))
+    if model_run is not None:
+        query = query.where(EntityMention.model_run == model_run)
+    return list(query.tuples())
+
+
+def get_puzzle_entities(puzzle_id: int, model_run: ModelRun) -> List[Tuple[str, str, int, int]]:
+    """Returns the (label, text, start, end) stored for a puzzle by a model run, in text order"""
+    query = (EntityMention
+             .select(EntityMention.label, EntityMention.text, EntityMention.start, EntityMention.end)
+             .where(EntityMention.puzzle == puzzle_id, EntityMention.model_run == model_run)
+             .order_by(EntityMention.start))
+    return list(query.tuples())
+
+
+def _mentions_missing_from(model_run: ModelRun, other_run: ModelRun):
+    """The puzzles having a mention in `model_run` that `other_run` does not have (same label and offsets)"""
+    Other = EntityMention.alias()
+    matching_mentions = (Other
+                         .select(Other.id)
+                         .where(Other.model_run == other_run,
+                                Other.puzzle == EntityMention.puzzle,
+                                Other.label == EntityMention.label,
+                                Other.start == EntityMention.start,
+                                Other.end == EntityMention.end))
+    return (EntityMention
+            .select(EntityMention.puzzle)
+            .where(EntityMention.model_run == model_run, ~fn.EXISTS(matching_mentions)))
+
+
+def get_disagreements(model_run_a: ModelRun, model_run_b: ModelRun) -> List[int]:
+    """Returns the IDs of the puzzles where the two model runs did not find exactly the same entities"""
+    query = (_mentions_missing_from(model_run_a, model_run_b) | _mentions_missing_from(model_run_b, model_run_a))
+    return sorted(puzzle_id for (puzzle_id,) in query.tuples())
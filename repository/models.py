@@ -1,7 +1,9 @@
-from peewee import *
+import datetime
 
+from peewee import *
+from playhouse.sqlite_ext import FTS5Model, RowIDField, SearchField
 
-db = SqliteDatabase('puzzles.db')
+from repository.connection import db
 
 
 class BaseModel(Model):
@@ -19,5 +21,54 @@ class Puzzle(BaseModel):
     title = CharField()
     description = TextField()
     clues = TextField()
-    url = CharField()
+    url = CharField(unique=True)
     source = ForeignKeyField(Source)
+    updated_at = DateTimeField(default=datetime.datetime.now, index=True)
+
+
+class CrawledPage(BaseModel):
+    """HTTP validators and content hash of the last fetch of a page, for the conditional requests of re-crawls"""
+    url = CharField(unique=True)
+    etag = CharField(null=True)
+    last_modified = CharField(null=True)
+    content_hash = CharField()
+    crawled_at = DateTimeField(default=datetime.datetime.now)
+
+
+class ModelRun(BaseModel):
+    """A version of an NER model whose entities were stored, identified by its path and fingerprint"""
+    model = CharField()
+    fingerprint = CharField()
+    created_at = DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        indexes = (
+            (("model", "fingerprint"), True),
+        )
+
+
+class EntityMention(BaseModel):
+    puzzle = ForeignKeyField(Puzzle, backref="entity_mentions", on_delete="CASCADE", index=False)
+    model_run = ForeignKeyField(ModelRun, backref="entity_mentions", on_delete="CASCADE")
+    label = CharField()
+    text = CharField()
+    start = IntegerField()
+    end = IntegerField()
+
+    class Meta:
+        indexes = (
+            (("label", "text"), False),
+            (("puzzle", "model_run"), False),
+        )
+
+
+class PuzzleIndex(FTS5Model):
+    """FTS5 index mirroring the searchable columns of `Puzzle`, kept in sync by triggers (see `create_search_index`)"""
+    rowid = RowIDField()
+    title = SearchField()
+    description = SearchField()
+    clues = SearchField()
+
+    class Meta:
+        database = db
+        table_name = "puzzle_index"
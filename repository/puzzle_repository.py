@@ -1,6 +1,14 @@
-from typing import List, Tuple
+import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from repository.models import Puzzle
+from peewee import OperationalError, chunked, fn
+
+from repository.models import Puzzle, PuzzleIndex, Source
+
+# SQLite limits the number of parameters bound to a query
+MAX_QUERY_PARAMETERS = 500
+UPSERT_CHUNK_SIZE = 500
+PAGE_SIZE = 1000
 
 
 def get_puzzle(uid: int) -> str:
@@ -21,34 +29,179 @@ def get_puzzle_with_title(uid: int) -> Tuple[str, str]:
 
 def get_puzzles_in_interval(from_uid: int, to_uid: int) -> List:
     """Return the clues for a given interval of Puzzle ID"""
-    retrieved_puzzles = list(Puzzle.filter(Puzzle.id >= from_uid, Puzzle.id <= to_uid))
-    if not retrieved_puzzles:
+    clues = [(title, puzzle_clues) for _, title, puzzle_clues in iter_puzzles(from_uid - 1, to_uid)]
+    if not clues:
         raise Exception(f"There is no puzzle with ID {from_uid}")
-    clues = [(puzzle.title, puzzle.clues) for puzzle in retrieved_puzzles]
-    # result = "\n\n".join(clues)
     return clues
 
 
-def get_testing_puzzles(ids: List[int]) -> List[str]:
-    """Returns the clues of the puzzles having the id in the given ids list"""
-    all_puzzles = Puzzle.select()
-    puzzles_dict = {puzzle.id: puzzle.clues for puzzle in all_puzzles}
-    clues = [clue for id_, clue in puzzles_dict.items() if id_ in ids]
-    return clues
+def get_all_puzzles_with_title() -> List[Tuple[str, str]]:
+    """Return the title and the clues of all the puzzles"""
+    return [(puzzle.title, puzzle.clues) for puzzle in Puzzle.select().order_by(Puzzle.id)]
 
 
-def get_testing_puzzles_with_title(ids: List[int]) -> List[str]:
-    """Returns the clues of the puzzles having the id in the given ids list"""
-    all_puzzles = Puzzle.select()
-    puzzles_dict = {puzzle.id: (puzzle.title, puzzle.clues) for puzzle in all_puzzles}
-    puzzles = [(title, clue) for id_, (title, clue) in puzzles_dict.items() if id_ in ids]
-    return puzzles
+def iter_puzzles(after_uid: int = 0,
+                 to_uid: Optional[int] = None,
+                 source: Optional[Union[Source, int]] = None,
+                 updated_since: Optional[datetime.datetime] = None,
+                 page_size: int = PAGE_SIZE) -> Iterator[Tuple[int, str, str]]:
+    """
+    Yields the (id, title, clues) of the puzzles with an ID greater than `after_uid`, ordered by ID, optionally
+    only up to `to_uid` (inclusive), of one source, or updated since the given time.
+    The puzzles are read by pages of `page_size` rows with keyset pagination (`id > last_id LIMIT page_size`),
+    so every page is an index range scan, and no cursor stays open between the pages.
+    """
+    conditions = []
+    if to_uid is not None:
+        conditions.append(Puzzle.id <= to_uid)
+    if source is not None:
+        conditions.append(Puzzle.source == source)
+    if updated_since is not None:
+        conditions.append(Puzzle.updated_at >= updated_since)
+    return _iter_pages((Puzzle.id, Puzzle.title, Puzzle.clues), conditions, after_uid, page_size)
+
+
+def iter_puzzles_with_metadata(page_size: int = PAGE_SIZE) -> Iterator[Tuple[int, str, str, int, datetime.datetime]]:
+    """Yields the (id, title, clues, source_id, updated_at) of all the puzzles, ordered by ID"""
+    columns = (Puzzle.id, Puzzle.title, Puzzle.clues, Puzzle.source, Puzzle.updated_at)
+    return _iter_pages(columns, [], 0, page_size)
+
+
+def _iter_pages(columns: Tuple, conditions: List, after_uid: int, page_size: int) -> Iterator[Tuple]:
+    """Keyset pagination: yields the given columns of the puzzles by pages, ordered by ID (the first column)"""
+    last_id = after_uid
+    while True:
+        page = list(Puzzle
+                    .select(*columns)
+                    .where(Puzzle.id > last_id, *conditions)
+                    .order_by(Puzzle.id)
+                    .limit(page_size)
+                    .tuples())
+        yield from page
+        if len(page) < page_size:
+            return
+        last_id = page[-1][0]
+
+
+def iter_source_puzzle_urls(source: Union[Source, int]) -> Iterator[str]:
+    """Yields the urls of the stored puzzles of a source"""
+    query = Puzzle.select(Puzzle.url).where(Puzzle.source == source).tuples()
+    return (url for (url,) in query.iterator())
+
+
+def iter_updated_puzzle_urls(updated_since: datetime.datetime, source: Union[Source, int]) -> Iterator[str]:
+    """Yields the urls of the puzzles of a source inserted or updated since the given time"""
+    query = (Puzzle
+             .select(Puzzle.url)
+             .where(Puzzle.source == source, Puzzle.updated_at >= updated_since)
+             .tuples())
+    return (url for (url,) in query.iterator())
+
+
+def _select_by_ids(columns: Tuple, ids: Iterable[int]) -> Iterator[Tuple]:
+    """Yields the given columns of the puzzles having the id in the given ids, ordered by id.
+    The filtering runs in SQLite: a range of IDs becomes a BETWEEN, a list becomes IN queries of bounded size."""
+    if isinstance(ids, range) and ids.step == 1:
+        conditions = [Puzzle.id.between(ids.start, ids.stop - 1)] if ids else []
+    else:
+        sorted_ids = sorted(set(ids))
+        conditions = [Puzzle.id.in_(sorted_ids[i:i + MAX_QUERY_PARAMETERS])
+                      for i in range(0, len(sorted_ids), MAX_QUERY_PARAMETERS)]
+    for condition in conditions:
+        yield from Puzzle.select(*columns).where(condition).order_by(Puzzle.id).tuples().iterator()
 
 
-def get_training_puzzles(excluded_ids: List[int]) -> List[str]:
+def get_testing_puzzles(ids: Iterable[int]) -> Iterator[str]:
     """Returns the clues of the puzzles having the id in the given ids list"""
-    all_puzzles = Puzzle.select()
-    puzzles_dict = {puzzle.id: puzzle.clues for puzzle in all_puzzles}
-    clues = [clue for id_, clue in puzzles_dict.items() if id_ not in excluded_ids and id_ < 70]
-    return clues
+    return (clues for (clues,) in _select_by_ids((Puzzle.clues,), ids))
+
+
+def get_testing_puzzles_with_title(ids: Iterable[int]) -> Iterator[Tuple[str, str]]:
+    """Returns the (title, clues) of the puzzles having the id in the given ids list"""
+    return _select_by_ids((Puzzle.title, Puzzle.clues), ids)
+
+
+def get_training_puzzles(excluded_ids: List[int], max_id: int = 70) -> Iterator[str]:
+    """Returns the clues of the puzzles having an id lower than `max_id` and not in the given excluded ids.
+    The excluded ids are filtered out in Python, so their number does not bound the query parameters."""
+    excluded_ids = set(excluded_ids)
+    query = (Puzzle
+             .select(Puzzle.id, Puzzle.clues)
+             .where(Puzzle.id < max_id)
+             .order_by(Puzzle.id))
+    return (clues for puzzle_id, clues in query.tuples().iterator() if puzzle_id not in excluded_ids)
+
+
+def search_puzzles(query: str, limit: int = 20, phrase: bool = False) -> List[Tuple[int, float, str]]:
+    """
+    Returns the (id, score, snippet) of the puzzles whose title, description or clues match an FTS5 query,
+    best matches first (lower bm25 scores are better). With `phrase`, the query is searched as an exact phrase;
+    a query that is not valid FTS5 syntax (e.g. a term with punctuation) is searched as a phrase too.
+    """
+    if phrase:
+        query = '"{}"'.format(query.replace('"', '""'))
+    snippet = fn.snippet(PuzzleIndex._meta.entity, -1, "[", "]", "...", 12)
+    results = (PuzzleIndex
+               .select(PuzzleIndex.rowid, PuzzleIndex.bm25().alias("score"), snippet.alias("snippet"))
+               .where(PuzzleIndex.match(query))
+               .order_by(PuzzleIndex.bm25())
+               .limit(limit)
+               .tuples())
+    try:
+        return list(results)
+    except OperationalError:
+        if phrase:
+            raise
+        return search_puzzles(query, limit, phrase=True)
+
+
+def get_or_create_source(name: str, domain: str, puzzles_path: str) -> Source:
+    """Returns the source with the given domain and puzzles path, creating it on the first crawl"""
+    source, _ = Source.get_or_create(domain=domain, puzzles_path=puzzles_path, defaults={"name": name})
+    return source
+
+
+def _puzzle_row(puzzle: Puzzle) -> Dict:
+    return {"title": puzzle.title, "description": puzzle.description, "clues": puzzle.clues,
+            "url": puzzle.url, "source": puzzle.source_id}
+
+
+_UPSERTED_FIELDS = [Puzzle.title, Puzzle.description, Puzzle.clues, Puzzle.source, Puzzle.updated_at]
+
 
+def upsert_puzzles(puzzles: Iterable[Puzzle], chunk_size: int = UPSERT_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Inserts the new puzzles and updates the changed ones, matched by their `url`, in one transaction per chunk.
+    Puzzles identical to the stored ones are skipped, so re-crawls are idempotent.
+    Returns the number of inserted, updated and skipped puzzles.
+    """
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    compared_fields = ("title", "description", "clues", "source")
+    for chunk in chunked(puzzles, chunk_size):
+        updated_at = datetime.datetime.now()
+        # the last version of a puzzle crawled twice wins
+        rows = {row["url"]: row for row in map(_puzzle_row, chunk)}
+        counts["skipped"] += len(chunk) - len(rows)
+        with Puzzle._meta.database.atomic():
+            stored = {url: (title, description, clues, source_id)
+                      for url, title, description, clues, source_id in Puzzle
+                      .select(Puzzle.url, Puzzle.title, Puzzle.description, Puzzle.clues, Puzzle.source)
+                      .where(Puzzle.url.in_(list(rows)))
+                      .tuples()}
+            changed_rows = []
+            for url, row in rows.items():
+                if url not in stored:
+                    counts["inserted"] += 1
+                elif stored[url] != tuple(row[field] for field in compared_fields):
+                    counts["updated"] += 1
+                else:
+                    counts["skipped"] += 1
+                    continue
+                changed_rows.append({**row, "updated_at": updated_at})
+            # each row binds one parameter per column
+            for batch in chunked(changed_rows, MAX_QUERY_PARAMETERS // (len(_UPSERTED_FIELDS) + 1)):
+                (Puzzle
+                 .insert_many(batch)
+                 .on_conflict(conflict_target=[Puzzle.url], preserve=_UPSERTED_FIELDS)
+                 .execute())
+    return counts
@@ -0,0 +1,178 @@
+"""
+Read-only snapshot of the puzzles, for pools of worker processes.
+
+The snapshot is a columnar file mapped in memory:
+
+    header   magic, puzzles count
+    ids      int64[count], sorted
+    sources  int64[count]
+    updated  float64[count], POSIX timestamps
+    offsets  uint64[2 * count + 1], the start of the title and of the clues of each puzzle in the blob
+    blob     the UTF-8 titles and clues
+
+The columns are `memoryview`s over the mapping, so loading the snapshot reads nothing, and the workers forked
+after `load_snapshot` share its pages with the parent. `PuzzleSnapshot` has the read functions of
+`repository.puzzle_repository`.
+"""
+import datetime
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from repository.puzzle_repository import iter_puzzles_with_metadata
+
+SNAPSHOT_FILE = ".cache/puzzles.snapshot"
+
+_MAGIC = b"PZSNAP01"
+_HEADER = struct.Struct("<8sQ")
+
+
+def create_snapshot(snapshot_file: str = SNAPSHOT_FILE) -> int:
+    """Writes the snapshot of all the puzzles of the DB, replacing the previous one; returns the puzzles count"""
+    ids, sources, updated, offsets = array("q"), array("q"), array("d"), array("Q", [0])
+    snapshot_dir = os.path.dirname(snapshot_file) or "."
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with tempfile.TemporaryFile(dir=snapshot_dir) as blob:
+        for puzzle_id, title, clues, source_id, updated_at in iter_puzzles_with_metadata():
+            ids.append(puzzle_id)
+            sources.append(source_id)
+            updated.append(updated_at.timestamp() if updated_at else 0.0)
+            for text in (title, clues):
+                offsets.append(offsets[-1] + blob.write(text.encode("utf-8")))
+
+        with tempfile.NamedTemporaryFile(dir=snapshot_dir, delete=False) as f:
+            f.write(_HEADER.pack(_MAGIC, len(ids)))
+            for column in (ids, sources, updated, offsets):
+                column.tofile(f)
+            blob.seek(0)
+            while True:
+                data = blob.read(1 << 20)
+                if not data:
+                    break
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, snapshot_file)
+    return len(ids)
+
+
+class PuzzleSnapshot:
+    """Read-only view of a snapshot file, with the read functions of `repository.puzzle_repository`"""
+
+    def __init__(self, snapshot_file: str = SNAPSHOT_FILE):
+        self.snapshot_file = snapshot_file
+        with open(snapshot_file, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC:
+            raise ValueError(f"{snapshot_file} is not a puzzles snapshot")
+
+        self._view = memoryview(self._mmap)
+        position = _HEADER.size
+
+        def column(type_code: str, length: int) -> memoryview:
+            nonlocal position
+            size = length * 8
+            result = self._view[position:position + size].cast(type_code)
+            position += size
+            return result
+
+        self.ids = column("q", count)
+        self.sources = column("q", count)
+        self.updated = column("d", count)
+        self._offsets = column("Q", 2 * count + 1)
+        self._blob = self._view[position:]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _text(self, index: int) -> str:
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], "utf-8")
+
+    def _row(self, row: int) -> Tuple[int, str, str]:
+        return self.ids[row], self._text(2 * row), self._text(2 * row + 1)
+
+    def _find(self, uid: int) -> int:
+        row = bisect_left(self.ids, uid)
+        if row == len(self.ids) or self.ids[row] != uid:
+            raise Exception(f"There is no puzzle with ID {uid}")
+        return row
+
+    def get_puzzle(self, uid: int) -> str:
+        """Return the clues for a given Puzzle ID"""
+        return self._text(2 * self._find(uid) + 1)
+
+    def get_puzzle_with_title(self, uid: int) -> Tuple[str, str]:
+        row = self._find(uid)
+        return self._text(2 * row), self._text(2 * row + 1)
+
+    def iter_puzzles(self,
+                     after_uid: int = 0,
+                     to_uid: Optional[int] = None,
+                     source: Optional[int] = None,
+                     updated_since: Optional[datetime.datetime] = None,
+                     page_size: Optional[int] = None) -> Iterator[Tuple[int, str, str]]:
+        """Same as `repository.puzzle_repository.iter_puzzles`; `page_size` is accepted for compatibility"""
+        start = bisect_right(self.ids, after_uid)
+        stop = bisect_right(self.ids, to_uid) if to_uid is not None else len(self.ids)
+        source_id = getattr(source, "id", source)
+        since = updated_since.timestamp() if updated_since is not None else None
+        for row in range(start, stop):
+            if source_id is not None and self.sources[row] != source_id:
+                continue
+            if since is not None and self.updated[row] < since:
+                continue
+            yield self._row(row)
+
+    def get_puzzles_in_interval(self, from_uid: int, to_uid: int) -> List:
+        clues = [(title, puzzle_clues) for _, title, puzzle_clues in self.iter_puzzles(from_uid - 1, to_uid)]
+        if not clues:
+            raise Exception(f"There is no puzzle with ID {from_uid}")
+        return clues
+
+    def get_all_puzzles_with_title(self) -> List[Tuple[str, str]]:
+        return [(title, clues) for _, title, clues in self.iter_puzzles()]
+
+    def _rows_of(self, ids: Iterable[int]) -> Iterator[int]:
+        for uid in sorted(set(ids)):
+            row = bisect_left(self.ids, uid)
+            if row < len(self.ids) and self.ids[row] == uid:
+                yield row
+
+    def get_testing_puzzles(self, ids: Iterable[int]) -> Iterator[str]:
+        return (self._text(2 * row + 1) for row in self._rows_of(ids))
+
+    def get_testing_puzzles_with_title(self, ids: Iterable[int]) -> Iterator[Tuple[str, str]]:
+        return ((self._text(2 * row), self._text(2 * row + 1)) for row in self._rows_of(ids))
+
+    def get_training_puzzles(self, excluded_ids: List[int], max_id: int = 70) -> Iterator[str]:
+        excluded_ids = set(excluded_ids)
+        return (clues for uid, _, clues in self.iter_puzzles(to_uid=max_id - 1) if uid not in excluded_ids)
+
+    def close(self):
+        for column in (self.ids, self.sources, self.updated, self._offsets, self._blob, self._view):
+            column.release()
+        self._mmap.close()
+
+
+_snapshot: Optional[PuzzleSnapshot] = None
+
+
+def load_snapshot(snapshot_file: str = SNAPSHOT_FILE) -> PuzzleSnapshot:
+    """Maps the snapshot in this process; call it before creating the worker pool so the workers inherit it"""
+    global _snapshot
+    if _snapshot is None or _snapshot.snapshot_file != snapshot_file:
+        _snapshot = PuzzleSnapshot(snapshot_file)
+    return _snapshot
+
+
+def get_snapshot() -> PuzzleSnapshot:
+    """Returns the snapshot mapped by `load_snapshot`, in this process or in the parent it was forked from"""
+    if _snapshot is None:
+        raise Exception("No puzzles snapshot is loaded, call load_snapshot first")
+    return _snapshot
@@ -1,10 +1,9 @@
 import re
 from typing import List, Tuple, Any
 
-import spacy
-
 from custom_training import pretty_print_ner
 from repository.puzzle_repository import get_puzzles_in_interval, get_testing_puzzles, get_training_puzzles
+from model_registry import get_model
 from utils import save_data
 
 # nlp = spacy.load("ner_first_10_puzzles_model")
@@ -23,7 +22,7 @@ def create_testing_set_for_a_puzzle(text: str, model: str) -> Tuple[Any, List[Tu
     # nlp.add_pipe("entity_ruler", source=custom_nlp, before="ner")
     #
     # doc = nlp(text)
-    nlp = spacy.load(model)
+    nlp = get_model(model)
     doc = nlp(text)
 
     entities = []
@@ -58,7 +57,7 @@ def get_entity_coordinates(entity_text: str, clue_text: str) -> Tuple[str, List[
 
 
 def ner_on_list(clues_list: List[str]):
-    nlp = spacy.load("models/ner_brainzilla_puzzles_model_50_lg")
+    nlp = get_model("models/ner_brainzilla_puzzles_model_50_lg")
     docs = []
     for text in clues_list:
         doc = nlp(text)
@@ -75,7 +74,7 @@ def main():
     # print(res)
 
     testing_puzzles_ids = [11, 13, 17, 19, 27, 33, 36, 42, 47, 51, 55, 58, 61, 64, 69]
-    clues_list = get_testing_puzzles(ids=testing_puzzles_ids)
+    clues_list = list(get_testing_puzzles(ids=testing_puzzles_ids))
     # clues_list = get_training_puzzles(excluded_ids=testing_puzzles_ids)
     print(len(clues_list))
     ner_on_list(clues_list)